@@ -0,0 +1,57 @@
+'''atop: All Things Options.
+
+The pricers are available from the top level, e.g.
+
+    import atop
+    atop.BsmNode('Call', 100, 110, 0.3, 0.05, 1).price
+
+Submodules are only imported when one of their names is first used, so
+`import atop` itself costs next to nothing.'''
+
+import importlib
+
+# public name -> module defining it
+_EXPORTS = {
+    'BsmNode': 'atop.blackscholes.bsmnode',
+    'BsmChain': 'atop.blackscholes.bsmchain',
+    'bsm_chain_price': 'atop.blackscholes.bsmchain',
+    'ImpliedVolChain': 'atop.blackscholes.impliedvol',
+    'VolSurface': 'atop.blackscholes.volsurface',
+    'BinomialOption': 'atop.options.binomialoption',
+    'CallOption': 'atop.options.calloption',
+    'PutOption': 'atop.options.putoption',
+    'NPeriodBOPM': 'atop.options.nperiodbopm',
+    'BinTree': 'atop.options.tree',
+    'Binodes': 'atop.options.tree',
+    'ReplicationSchedule': 'atop.options.replication',
+    'SimpleCall': 'atop.simpleops.simplecall',
+    'SimplePut': 'atop.simpleops.simpleput',
+    'MonteCarloPricer': 'atop.montecarlo.mcpricer',
+    'CrankNicolson': 'atop.finitediff.cranknicolson',
+    'OptionPortfolio': 'atop.opsport',
+    'ScenarioGrid': 'atop.stressgrid',
+    'ParallelPricer': 'atop.parallel',
+    'PayoffAsset': 'atop.diagram',
+    'PayoffDiagram': 'atop.diagram',
+    'price_file': 'atop.quotestream',
+    'PricingCache': 'atop.util.pricecache',
+    'generate_asset_tag': 'atop.util.tagit',
+    'ColumnStore': 'atop.util.colstore',
+    'norm_cdf': 'atop.util.normal',
+    'norm_pdf': 'atop.util.normal',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,147 @@
+from functools import cached_property
+
+import numpy as np
+
+from atop.util.normal import norm_cdf, norm_pdf
+
+
+def bsm_chain_d1(underlying, strike, volatility, risk_free, time_in_years, dividend_yield = 0.0):
+    '''Vectorized d1 for arrays of contracts.'''
+    return ((np.log(underlying/strike) + (risk_free - dividend_yield + (volatility**2)/2)*time_in_years) /
+            (volatility * np.sqrt(time_in_years)))
+
+
+def bsm_chain_price(is_call, underlying, strike, volatility, risk_free, time_in_years, dividend_yield = 0.0):
+    '''Vectorized Black-Scholes-Merton price only.
+
+    Lean entry point for engines that need the price many times over
+    (solvers, scenario grids) and don't want the greeks recomputed every call.
+    `is_call` is a boolean array, True where the contract is a call.'''
+    sign = np.where(is_call, 1.0, -1.0)
+    sqrt_time = np.sqrt(time_in_years)
+    d1 = ((np.log(underlying/strike) + (risk_free - dividend_yield + (volatility**2)/2)*time_in_years) /
+          (volatility * sqrt_time))
+    d2 = d1 - volatility * sqrt_time
+    return sign * (underlying * np.exp(-dividend_yield * time_in_years) * norm_cdf(sign*d1)
+                   - strike * np.exp(-risk_free * time_in_years) * norm_cdf(sign*d2))
+
+
+class BsmChain:
+    '''Vectorized Black-Scholes-Merton calculations for a whole option chain
+
+    Same inputs and outputs as BsmNode but every parameter may be a NumPy array
+    (or anything np.asarray accepts). Arrays are broadcast against each other, so
+    a single volatility or risk-free rate can be shared by the whole chain.
+    `op_type` holds 'Call' or 'Put' per contract, dividend_yield is a
+    continuous yield as in BsmNode.
+
+    The intermediate values, price, delta, gamma and theta are computed in one
+    vectorized pass and stored as arrays, matching BsmNode contract by contract.
+    vega, rho, vanna, volga, charm and speed are closed form too, computed from
+    the same stored terms on first access and then kept, so chains that only
+    need prices don't pay for them.'''
+    def __init__(self, op_type, underlying, strike, volatility, risk_free, time_in_years, trade_position = 'Long',
+                 dividend_yield = 0.0):
+        (self.op_type,
+         self.underlying,
+         self.strike,
+         self.volatility,
+         self.risk_free,
+         self.time_in_years,
+         self.dividend_yield) = np.broadcast_arrays(np.asarray(op_type),
+                                                   np.asarray(underlying, dtype=float),
+                                                   np.asarray(strike, dtype=float),
+                                                   np.asarray(volatility, dtype=float),
+                                                   np.asarray(risk_free, dtype=float),
+                                                   np.asarray(time_in_years, dtype=float),
+                                                   np.asarray(dividend_yield, dtype=float))
+        self.trade_position = trade_position  # by default is long. This does NOT affect calculations.
+
+        # shared terms, computed once for the whole chain.
+        self.is_call = self.op_type == 'Call'
+        self.sign = np.where(self.is_call, 1.0, -1.0)
+        self.sqrt_time = np.sqrt(self.time_in_years)
+        self.discount = np.exp(-self.risk_free * self.time_in_years)
+        self.dividend_discount = np.exp(-self.dividend_yield * self.time_in_years)
+
+        # Internal Calculations.
+        self.d1 = self.d1_calc()
+        self.d2 = self.d2_calc()
+        self.n1, self.n2 = self.normcdf_calc()
+        self.pdf_d1 = norm_pdf(self.d1)
+
+        self.price = self.price_calc()
+
+        # greeks
+        self.delta = self.delta_calc()
+        self.gamma = self.gamma_calc()
+        self.theta = self.theta_calc()
+
+    def __repr__(self):
+        return '\nBlack-Scholes-Merton chain of {} contracts.'.format(self.price.size)
+
+    def __len__(self):
+        return self.price.size
+
+    # internal class calculations.
+    def d1_calc(self):
+        return ((np.log(self.underlying/self.strike)
+                 + (self.risk_free - self.dividend_yield + (self.volatility**2)/2)*self.time_in_years) /
+                (self.volatility * self.sqrt_time))
+
+    def d2_calc(self):
+        return self.d1 - self.volatility * self.sqrt_time
+
+    def normcdf_calc(self):
+        # calls use N(d), puts use N(-d)
+        n1 = norm_cdf(self.sign * self.d1)
+        n2 = norm_cdf(self.sign * self.d2)
+        return [n1, n2]
+
+    def price_calc(self):
+        return self.sign * (self.underlying * self.dividend_discount * self.n1 - self.strike * self.discount * self.n2)
+
+    # the greeks
+    def delta_calc(self):
+        # call: exp(-qT) N(d1), put: -exp(-qT) N(-d1)
+        return self.sign * self.dividend_discount * self.n1
+
+    def gamma_calc(self):
+        return self.dividend_discount * self.pdf_d1 / (self.underlying * self.volatility * self.sqrt_time)
+
+    def theta_calc(self):
+        # the normal pdf is symmetric so pdf(-d1) == pdf(d1) for puts.
+        return (-((self.underlying * self.dividend_discount * self.pdf_d1 * self.volatility) / (2 * self.sqrt_time))
+                - self.sign * self.risk_free * self.strike * self.discount * self.n2
+                + self.sign * self.dividend_yield * self.underlying * self.dividend_discount * self.n1)
+
+    # closed form greeks computed on first access.
+    @cached_property
+    def vega(self):
+        return self.underlying * self.dividend_discount * self.pdf_d1 * self.sqrt_time
+
+    @cached_property
+    def rho(self):
+        return self.sign * self.strike * self.time_in_years * self.discount * self.n2
+
+    @cached_property
+    def vanna(self):
+        return -self.dividend_discount * self.pdf_d1 * self.d2 / self.volatility
+
+    @cached_property
+    def volga(self):
+        return self.vega * self.d1 * self.d2 / self.volatility
+
+    @cached_property
+    def charm(self):
+        drift = ((2 * (self.risk_free - self.dividend_yield) * self.time_in_years
+                  - self.d2 * self.volatility * self.sqrt_time)
+                 / (2 * self.time_in_years * self.volatility * self.sqrt_time))
+        return self.dividend_discount * (self.sign * self.dividend_yield * self.n1 - self.pdf_d1 * drift)
+
+    @cached_property
+    def speed(self):
+        return -(self.gamma / self.underlying) * (self.d1 / (self.volatility * self.sqrt_time) + 1)
+
+    def get_trade_position(self):
+        return self.trade_position
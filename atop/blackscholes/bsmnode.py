@@ -1,8 +1,46 @@
 # don't create a parent class here. There is nothing to be gained doing that.
 
-from scipy.stats import norm
 from math import exp, log, sqrt
 
+from atop.util import instrument
+from atop.util.normal import norm_cdf, norm_pdf
+
+# the inputs of a node. Changing any of them invalidates every cached calculation.
+_INPUTS = ('op_type', 'underlying', 'strike', 'volatility', 'risk_free', 'time_in_years', 'dividend_yield')
+
+# lazily computed values, cached in the slot of the same name with a leading underscore.
+_CACHED = ('sqrt_time', 'discount', 'dividend_discount', 'd1', 'd2', 'cdf', 'pdf_d1', 'price',
+           'delta', 'gamma', 'theta', 'vega', 'rho', 'vanna', 'volga', 'charm', 'speed')
+
+
+class _Cached:
+    '''A node value calculated on first access and cached in the slot of the same
+    name with a leading underscore.
+
+    calc names the node method that calculates it. When phase_name is given and
+    an atop.util.instrument sink is set, the calculation reports its time under
+    that name; cheap shared terms pass no phase_name and are never timed.'''
+    def __init__(self, calc, phase_name = None):
+        self.calc = calc
+        self.phase_name = phase_name
+
+    def __set_name__(self, owner, name):
+        self.slot = '_' + name
+
+    def __get__(self, node, owner = None):
+        if node is None:
+            return self
+        value = getattr(node, self.slot)
+        if value is None:
+            calc = getattr(node, self.calc)
+            if self.phase_name is None or instrument.sink is None:
+                value = calc()
+            else:
+                value = instrument.timed('BsmNode', self.phase_name, calc)
+            object.__setattr__(node, self.slot, value)  # not an input, so no cache invalidation
+        return value
+
+
 class BsmNode:
     '''Data container for Black-Scholes-Merton calculations
     
@@ -10,134 +48,206 @@ class BsmNode:
     the contract's strike price, the annual volatility of the underlying, a 
     continuously compounded annual risk-free rate, and a length of time (in years)
     the class will generate and store all intermediate calculation values as well
-    as various greek values associated with the option.
+    as various greek values associated with the option. An optional continuously
+    compounded annual dividend yield (dividend_yield, as annual_cc_dividend_yield
+    in bsm_old) is paid by the underlying.
     
-    Primary calculation is the option price.
-
-    Currently does not support options where the underlying has intermediate cash
-    flows such as a stock with a dividend payment. It will be implemented in the 
-    future.'''
-    def __init__(self, op_type, underlying, strike, volatility, risk_free, time_in_years, trade_position = 'Long'):
-        self.op_type = op_type
-        self.underlying = underlying
-        self.strike = strike
-        self.volatility = volatility
-        self.risk_free = risk_free
-        self.time_in_years = time_in_years
-        self.trade_postion = trade_position  # by default is long. This does NOT affect calculations.
-
-        # Internal Calculations.
-        self.d1 = self.d1_calc()
-        self.d2 = self.d2_calc()
-        self.n1 = self.normcdf_calc()[0]
-        self.n2 = self.normcdf_calc()[1]
-
-        self.price = self.price_calc()
-        
-        # greeks
-        self.delta = self.delta_calc()
-        self.gamma = self.gamma_calc()
-        self.theta = self.theta_calc()
-        #self.vega = self.vega_calc()
-        #self.rho = self.rho_calc()
-
-        # dev note:
-        # Additional values can be calculated such as the discount factor: exp(-self.risk_free * self.time_in_years),
-        # but that wouldn't be a 'true' annual discount factor... which might confuse people. 
-        # Additionally, saving the sqrt(self.time_in_years) because it's used multiple times.
-        # The efficiency gains might be substantial though.
-        # But the cost is a bigger data container...
-        # 
-        # On another note:
-        # Currently the class parameters can be changed. However the calculations will not update. Consider fixing this.
+    Primary calculation is the option price. The greeks are all closed form:
+    delta, gamma, theta, vega, rho and the second order vanna (d delta / d vol),
+    volga (d vega / d vol), charm (d delta / d t, per year of calendar time, the
+    same sign convention as theta) and speed (d gamma / d underlying). vega,
+    vanna and volga are per unit of volatility, rho per unit of rate.
+
+    Nodes are lean: __slots__ instead of a __dict__, and nothing is calculated
+    until it is asked for. d1, d2, n1, n2, price and the greeks are computed on
+    first access and cached, together with the shared terms sqrt(T), the
+    discount factors exp(-rT) and exp(-qT) and the normal pdf of d1, which the
+    greeks reuse. Changing any input (op_type, underlying, strike, volatility,
+    risk_free, time_in_years, dividend_yield) clears the cache, so values
+    never go stale.
+
+    Calculations report their time to atop.util.instrument when a sink is set.
+
+    Discrete cash flows of the underlying (a stock's individual dividend
+    payments) are not supported, only a continuous yield.'''
+    __slots__ = _INPUTS + ('trade_postion',) + tuple('_' + name for name in _CACHED)
+
+    def __init__(self, op_type, underlying, strike, volatility, risk_free, time_in_years, trade_position = 'Long',
+                 dividend_yield = 0.0):
+        setattr_ = object.__setattr__  # skip the cache invalidation while constructing
+        setattr_(self, 'op_type', op_type)
+        setattr_(self, 'underlying', underlying)
+        setattr_(self, 'strike', strike)
+        setattr_(self, 'volatility', volatility)
+        setattr_(self, 'risk_free', risk_free)
+        setattr_(self, 'time_in_years', time_in_years)
+        setattr_(self, 'dividend_yield', dividend_yield)
+        setattr_(self, 'trade_postion', trade_position)  # by default is long. This does NOT affect calculations.
+        self.clear_cache()
+        if instrument.sink is not None:
+            instrument.count('BsmNode', 'nodes')
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in _INPUTS:
+            self.clear_cache()
+
+    def clear_cache(self):
+        for name in _CACHED:
+            object.__setattr__(self, '_' + name, None)
+
+    # shared terms, computed once per set of inputs.
+    sqrt_time = _Cached('sqrt_time_calc')
+    discount = _Cached('discount_calc')
+    dividend_discount = _Cached('dividend_discount_calc')
+    pdf_d1 = _Cached('pdf_calc', 'pdf')
+    cdf = _Cached('normcdf_calc', 'cdf')  # [n1, n2]
+
+    # lazily calculated values.
+    d1 = _Cached('d1_calc', 'd1')
+    d2 = _Cached('d2_calc', 'd2')
+    price = _Cached('price_calc', 'price')
+    delta = _Cached('delta_calc', 'delta')
+    gamma = _Cached('gamma_calc', 'gamma')
+    theta = _Cached('theta_calc', 'theta')
+    vega = _Cached('vega_calc', 'vega')
+    rho = _Cached('rho_calc', 'rho')
+    vanna = _Cached('vanna_calc', 'vanna')
+    volga = _Cached('volga_calc', 'volga')
+    charm = _Cached('charm_calc', 'charm')
+    speed = _Cached('speed_calc', 'speed')
+
+    @property
+    def n1(self):
+        return self.cdf[0]
+
+    @property
+    def n2(self):
+        return self.cdf[1]
 
     def __repr__(self):
         text = '''\nData node of a Black-Scholes-Merton Model for a {op} option where the underlying is $ {under_p},
 with a strike price of $ {strike_p}, an annual volatility of {vol}, a continuously-compounded 
-risk-free rate of {rf}. The option expires in {years} years.'''.format(
+risk-free rate of {rf} and a dividend yield of {q}. The option expires in {years} years.'''.format(
                                                                     op = self.op_type,
                                                                     under_p = self.underlying,
                                                                     strike_p = self.strike,
                                                                     vol = self.volatility,
                                                                     rf = self.risk_free,
+                                                                    q = self.dividend_yield,
                                                                     years = self.time_in_years
                                                                     )
         return text
 
     # internal class calculations.
+    def sqrt_time_calc(self):
+        return sqrt(self.time_in_years)
+
+
+    def discount_calc(self):
+        return exp(-self.risk_free * self.time_in_years)
+
+
+    def dividend_discount_calc(self):
+        return exp(-self.dividend_yield * self.time_in_years)
+
+
+    def pdf_calc(self):
+        return norm_pdf(self.d1)
+
+
     def d1_calc(self):
-        return ((log(self.underlying/self.strike) + (self.risk_free + (self.volatility**2)/2)*self.time_in_years) / 
-        (self.volatility * sqrt(self.time_in_years)))
+        return ((log(self.underlying/self.strike)
+                 + (self.risk_free - self.dividend_yield + (self.volatility**2)/2)*self.time_in_years) /
+        (self.volatility * self.sqrt_time))
         
     
     def d2_calc(self):
-        return self.d1 - (self.volatility * sqrt(self.time_in_years))
+        return self.d1 - (self.volatility * self.sqrt_time)
     
 
     def normcdf_calc(self):
         if self.op_type == 'Call':
-            n1 = norm.cdf(self.d1)
-            n2 = norm.cdf(self.d2)
+            n1 = norm_cdf(self.d1)
+            n2 = norm_cdf(self.d2)
         else: 
             # must be a put
-            n1 = norm.cdf(-self.d1)
-            n2 = norm.cdf(-self.d2)
+            n1 = norm_cdf(-self.d1)
+            n2 = norm_cdf(-self.d2)
         return [n1, n2]
     
     
     def price_calc(self):
         if self.op_type == 'Call':
-            price = self.underlying * self.n1 - self.strike * exp(-self.risk_free * self.time_in_years) * self.n2
+            price = self.underlying * self.dividend_discount * self.n1 - self.strike * self.discount * self.n2
         else: 
             #must be a put
-            price = -self.underlying * self.n1 + self.strike * exp(-self.risk_free * self.time_in_years) * self.n2
+            price = -self.underlying * self.dividend_discount * self.n1 + self.strike * self.discount * self.n2
         return price
     
     
     # the greeks
     def delta_calc(self):
         if self.op_type == 'Call':
-            delta = norm.cdf(self.d1)
+            delta = self.dividend_discount * self.n1
         else:
-            #must be a put
-            delta = -norm.cdf(-self.d1)
+            #must be a put, n1 is already N(-d1)
+            delta = -self.dividend_discount * self.n1
         return delta
 
     
     def gamma_calc(self):
-        return (1/(self.underlying*self.volatility*sqrt(self.time_in_years))) * norm.pdf(self.d1)
+        return (self.dividend_discount/(self.underlying*self.volatility*self.sqrt_time)) * self.pdf_d1
     
     
     def theta_calc(self):
+        # the normal pdf is symmetric, so pdf(-d1) == pdf(d1) for puts too.
+        decay = -(self.underlying * self.dividend_discount * self.pdf_d1 * self.volatility) / (2 * self.sqrt_time)
         if self.op_type == 'Call':
-            theta = (-((self.underlying * norm.pdf(self.d1) * self.volatility)/(2 * sqrt(self.time_in_years))) 
-            - self.risk_free * self.strike * exp(-self.risk_free*self.time_in_years) * norm.cdf(self.d2))
+            theta = (decay - self.risk_free * self.strike * self.discount * self.n2
+                     + self.dividend_yield * self.underlying * self.dividend_discount * self.n1)
         else: 
-            #must be a put
-            theta = (-((self.underlying * norm.pdf(-self.d1) * self.volatility)/(2 * sqrt(self.time_in_years))) 
-            + self.risk_free * self.strike * exp(-self.risk_free*self.time_in_years) * norm.cdf(-self.d2))
+            #must be a put, n1 and n2 are already N(-d1) and N(-d2)
+            theta = (decay + self.risk_free * self.strike * self.discount * self.n2
+                     - self.dividend_yield * self.underlying * self.dividend_discount * self.n1)
         return theta
 
-    
-    # recommend not using vega
+
+    # vega, vanna, volga and speed are the same for calls and puts.
     def vega_calc(self):
+        return self.underlying * self.dividend_discount * self.pdf_d1 * self.sqrt_time
+
+
+    def rho_calc(self):
         if self.op_type == 'Call':
-            vega = self.underlying * norm.pdf(self.d1) * sqrt(self.time_in_years)
+            rho = self.strike * self.time_in_years * self.discount * self.n2
         else:
-            #must be a put
-            vega = self.strike * exp(-self.risk_free * self.time_in_years) * norm.pdf(self.d2) * sqrt(self.time_in_years)
-        return vega
-    
-    
-    # recommend not using rho
-    def rho_calc(self):
+            #must be a put, n2 is already N(-d2)
+            rho = -self.strike * self.time_in_years * self.discount * self.n2
+        return rho
+
+
+    def vanna_calc(self):
+        return -self.dividend_discount * self.pdf_d1 * self.d2 / self.volatility
+
+
+    def volga_calc(self):
+        return self.vega * self.d1 * self.d2 / self.volatility
+
+
+    def charm_calc(self):
+        drift = ((2 * (self.risk_free - self.dividend_yield) * self.time_in_years - self.d2 * self.volatility * self.sqrt_time)
+                 / (2 * self.time_in_years * self.volatility * self.sqrt_time))
         if self.op_type == 'Call':
-            pass
+            charm = self.dividend_discount * (self.dividend_yield * self.n1 - self.pdf_d1 * drift)
         else:
-            pass
-        return NotImplemented
+            #must be a put, n1 is already N(-d1)
+            charm = -self.dividend_discount * (self.dividend_yield * self.n1 + self.pdf_d1 * drift)
+        return charm
 
 
+    def speed_calc(self):
+        return -(self.gamma / self.underlying) * (self.d1 / (self.volatility * self.sqrt_time) + 1)
 
 
     def get_trade_position(self):
@@ -145,22 +255,24 @@ risk-free rate of {rf}. The option expires in {years} years.'''.format(
 
 
 
-    def print_calc_values(self, rounding = 2, hide_greeks = False, hide_d_calc = False, hide_n_calc = False, hide_delta = False, hide_gamma = False, hide_theta = False):
+    def print_calc_values(self, rounding = 2, hide_greeks = False, hide_d_calc = False, hide_n_calc = False, hide_delta = False, hide_gamma = False, hide_theta = False, hide_vega = False, hide_rho = False):
         '''A nice terminal display for checking internal values
         
         Mainly used for debugging. Can also be used to show answers for problems.
-        The greeks vega and rho are not implemented at this time.'''
+        The second order greeks are not displayed.'''
         
         #hiding greeks
         if hide_greeks:
             hide_delta = True
             hide_gamma = True
             hide_theta = True
+            hide_vega = True
+            hide_rho = True
         
         print(self.__repr__())
         
         # rounding and heads up message 
-        if hide_d_calc or hide_n_calc or hide_delta or hide_gamma or hide_theta:
+        if hide_d_calc or hide_n_calc or hide_delta or hide_gamma or hide_theta or hide_vega or hide_rho:
             print('Display values are rounded to {} decimals.'.format(rounding))
             print('Additionally, some values are hidden!')
         else:
@@ -198,6 +310,16 @@ risk-free rate of {rf}. The option expires in {years} years.'''.format(
             pass
         else:
             print('greek theta = {}'.format(round(self.theta, rounding)))
+
+        if hide_vega:
+            pass
+        else:
+            print('greek vega = {}'.format(round(self.vega, rounding)))
+
+        if hide_rho:
+            pass
+        else:
+            print('greek rho = {}'.format(round(self.rho, rounding)))
         
 #example = BsmNode('Call', 100, 110, 0.14247, 0.05, 1)
 #print(example.delta)
@@ -0,0 +1,124 @@
+import numpy as np
+
+from atop.util.normal import norm_cdf, norm_pdf
+
+
+class ImpliedVolChain:
+    '''Implied volatility for a whole chain of quoted option prices
+
+    Inverts the Black-Scholes-Merton model (same conventions as BsmNode and
+    BsmChain) for arrays of quotes at once. Each iteration takes a vectorized
+    Newton step using the analytic vega. Every quote also keeps a volatility
+    bracket [lower, upper] that is tightened on each evaluation; when a Newton
+    step leaves the bracket, or vega is too small to trust, that quote bisects
+    the bracket instead. Quotes are dropped from the working set as soon as they
+    converge, so late iterations only touch the stragglers.
+
+    Per quote results:
+        volatility  -- the implied volatility (nan where no solution exists)
+        converged   -- True where |model price - quote| <= tolerance
+        iterations  -- number of model evaluations spent on the quote
+        no_solution -- True where the quote breaks the no-arbitrage bounds'''
+    def __init__(self, op_type, price, underlying, strike, risk_free, time_in_years,
+                 tolerance = 1e-8, max_iterations = 100, vol_lower = 1e-4, vol_upper = 5.0):
+        (self.op_type,
+         self.market_price,
+         self.underlying,
+         self.strike,
+         self.risk_free,
+         self.time_in_years) = np.broadcast_arrays(np.asarray(op_type),
+                                                   np.asarray(price, dtype=float),
+                                                   np.asarray(underlying, dtype=float),
+                                                   np.asarray(strike, dtype=float),
+                                                   np.asarray(risk_free, dtype=float),
+                                                   np.asarray(time_in_years, dtype=float))
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.vol_lower = vol_lower
+        self.vol_upper = vol_upper
+
+        self.is_call = self.op_type == 'Call'
+        self.sign = np.where(self.is_call, 1.0, -1.0)
+        self.sqrt_time = np.sqrt(self.time_in_years)
+        self.discount = np.exp(-self.risk_free * self.time_in_years)
+
+        self.no_solution = self.bounds_calc()
+        self.volatility, self.converged, self.iterations = self.solve()
+
+    def __repr__(self):
+        return '\nImplied volatility chain of {} quotes, {} converged.'.format(
+            self.volatility.size, int(self.converged.sum()))
+
+    # internal class calculations.
+    def bounds_calc(self):
+        '''Flags quotes outside the no-arbitrage price bounds.
+
+        A call must be worth more than max(S - K*exp(-rT), 0) and less than S.
+        A put must be worth more than max(K*exp(-rT) - S, 0) and less than K*exp(-rT).'''
+        pv_strike = self.strike * self.discount
+        intrinsic = np.maximum(self.sign * (self.underlying - pv_strike), 0.0)
+        upper = np.where(self.is_call, self.underlying, pv_strike)
+        return ~((self.market_price > intrinsic) & (self.market_price < upper))
+
+    def initial_guess_calc(self):
+        # Manaster-Koehler starting point: the volatility at the inflection point of price in vol.
+        guess = np.sqrt(2 * np.abs(np.log(self.underlying/self.strike) + self.risk_free*self.time_in_years)
+                        / self.time_in_years)
+        guess = np.where(guess > 0, guess, 0.2)
+        return np.clip(guess, self.vol_lower, self.vol_upper)
+
+    def solve(self):
+        size = self.market_price.size
+        volatility = self.initial_guess_calc().ravel().copy()
+        lower = np.full(size, self.vol_lower)
+        upper = np.full(size, self.vol_upper)
+        converged = np.zeros(size, dtype=bool)
+        iterations = np.zeros(size, dtype=np.int64)
+
+        sign = self.sign.ravel()
+        underlying = self.underlying.ravel()
+        strike = self.strike.ravel()
+        target = self.market_price.ravel()
+        sqrt_time = self.sqrt_time.ravel()
+        pv_strike = (self.strike * self.discount).ravel()
+        drift = (self.risk_free * self.time_in_years).ravel()
+        log_moneyness = np.log(underlying/strike)
+
+        active = np.flatnonzero(~self.no_solution.ravel())
+        for _ in range(self.max_iterations):
+            if active.size == 0:
+                break
+            vol = volatility[active]
+            vol_sqrt_time = vol * sqrt_time[active]
+            d1 = (log_moneyness[active] + drift[active]) / vol_sqrt_time + vol_sqrt_time / 2
+            s = sign[active]
+            model = s * (underlying[active] * norm_cdf(s*d1) - pv_strike[active] * norm_cdf(s*(d1 - vol_sqrt_time)))
+            vega = underlying[active] * norm_pdf(d1) * sqrt_time[active]
+            iterations[active] += 1
+
+            diff = model - target[active]
+            done = np.abs(diff) <= self.tolerance
+            converged[active[done]] = True
+
+            # price is increasing in volatility, so the sign of diff tightens the bracket.
+            lo = np.where(diff < 0, vol, lower[active])
+            hi = np.where(diff > 0, vol, upper[active])
+            lower[active] = lo
+            upper[active] = hi
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                newton = vol - diff / vega
+            fallback = ~((newton > lo) & (newton < hi))
+            step = np.where(fallback, 0.5 * (lo + hi), newton)
+
+            # a collapsed bracket means the root is pinned down as tightly as floats allow.
+            pinned = (hi - lo) <= 1e-15 * hi
+            converged[active[pinned]] = True
+            done |= pinned
+
+            volatility[active[~done]] = step[~done]
+            active = active[~done]
+
+        volatility[self.no_solution.ravel()] = np.nan
+        shape = self.market_price.shape
+        return volatility.reshape(shape), converged.reshape(shape), iterations.reshape(shape)
@@ -0,0 +1,201 @@
+from math import exp, log
+
+import numpy as np
+
+from atop.blackscholes.impliedvol import ImpliedVolChain
+
+# starting grid for the outer SVI search: sigma values, and m at these quantiles of the quoted log-moneyness.
+_SIGMA_STARTS = (0.05, 0.2, 0.5)
+_M_QUANTILES = (0.25, 0.5, 0.75)
+
+
+def svi_total_variance(params, log_moneyness):
+    '''Raw SVI total implied variance w(k) = a + b*(rho*(k - m) + sqrt((k - m)**2 + sigma**2)).'''
+    a, b, rho, m, sigma = params
+    shifted = np.asarray(log_moneyness, dtype=float) - m
+    return a + b * (rho * shifted + np.sqrt(shifted * shifted + sigma * sigma))
+
+
+def svi_linear_calc(m, sigma, log_moneyness, total_variance, weights):
+    '''Inner step of the quasi-explicit fit: with m and sigma fixed, SVI is linear
+    in (a, d, c) = (a, rho*b*sigma, b*sigma) over y = (k - m)/sigma:
+        w = a + d*y + c*sqrt(y**2 + 1)
+    Solved by weighted least squares, then pulled back inside the no-arbitrage
+    domain 0 <= c <= 4*sigma, |d| <= min(c, 4*sigma - c), 0 <= a <= max(w).
+    Returns ((a, d, c), weighted squared error).'''
+    y = (log_moneyness - m) / sigma
+    z = np.sqrt(y * y + 1)
+    design = np.column_stack((np.ones_like(y), y, z)) * weights[:, None]
+    a, d, c = np.linalg.lstsq(design, total_variance * weights, rcond=None)[0]
+
+    c = min(max(c, 0.0), 4 * sigma)
+    bound = min(c, 4 * sigma - c)
+    d = min(max(d, -bound), bound)
+    # best a for the clipped (d, c) is the weighted mean of what is left.
+    a = np.sum(weights**2 * (total_variance - d * y - c * z)) / np.sum(weights**2)
+    a = min(max(a, 0.0), float(np.max(total_variance)))
+
+    error = np.sum((weights * (a + d * y + c * z - total_variance))**2)
+    return (a, d, c), error
+
+
+def fit_svi(log_moneyness, total_variance, weights = None, initial = None):
+    '''Fits raw SVI (a, b, rho, m, sigma) to one expiry's total variances.
+
+    Quasi-explicit method (Zeliade, 2009): the outer search runs over (m, sigma)
+    only, with Nelder-Mead from the best point of a small starting grid (or from
+    initial, the slice's previous fit), and the inner linear problem is solved
+    exactly for every trial point.'''
+    from scipy.optimize import minimize
+
+    log_moneyness = np.asarray(log_moneyness, dtype=float)
+    total_variance = np.asarray(total_variance, dtype=float)
+    weights = np.ones_like(total_variance) if weights is None else np.asarray(weights, dtype=float)
+
+    def objective(point):
+        m, log_sigma = point
+        return svi_linear_calc(m, exp(log_sigma), log_moneyness, total_variance, weights)[1]
+
+    starts = [(m, log(sigma)) for m in np.quantile(log_moneyness, _M_QUANTILES) for sigma in _SIGMA_STARTS]
+    if initial is not None:
+        starts.append((initial[3], log(initial[4])))
+    start = min(starts, key=objective)
+    best = minimize(objective, start, method='Nelder-Mead',
+                    options={'xatol': 1e-8, 'fatol': 1e-14, 'maxiter': 2000})
+
+    m, sigma = best.x[0], exp(best.x[1])
+    (a, d, c), error = svi_linear_calc(m, sigma, log_moneyness, total_variance, weights)
+    b = c / sigma
+    rho = d / c if c > 0 else 0.0
+    return (a, b, rho, m, sigma)
+
+
+class VolSurface:
+    '''Implied volatility surface: one SVI smile per expiry, total variance interpolated between expiries
+
+    Quotes are added per expiry (time_in_years) as strikes with implied vols
+    (set_slice) or with option prices, which are inverted with ImpliedVolChain
+    first (set_slice_prices). Smiles are fitted in log forward moneyness
+    k = log(strike / forward), forward = underlying * exp(risk_free * T).
+
+    Each slice remembers the quotes it was fitted to. fit() (called by the
+    lookups when needed) only refits slices whose quotes, or forward, changed
+    since their last fit, warm-starting from the previous parameters; refits
+    counts the slice fits done so far.
+
+    volatility(strike, time_in_years) and total_variance(...) take arrays
+    (broadcast against each other). Between expiries total variance is linear
+    in T at fixed log moneyness; before the first and after the last expiry the
+    nearest smile is extended at constant implied vol.'''
+    def __init__(self, underlying, risk_free = 0.0, vega_weights = True):
+        self.underlying = underlying
+        self.risk_free = risk_free
+        self.vega_weights = vega_weights  # weight quotes by BSM vega, so far wings count less
+        self.quotes = {}   # expiry -> (strikes, vols)
+        self.fits = {}     # expiry -> (quote key, params)
+        self.refits = 0
+        self.expiries = None  # sorted expiries and their parameter table, built by fit()
+        self.params = None
+
+    def __repr__(self):
+        return '\nSVI volatility surface of {} expiries, underlying {}.'.format(len(self.quotes), self.underlying)
+
+    def __setattr__(self, name, value):
+        # the forward moves with these, so every slice must be refit.
+        if name in ('underlying', 'risk_free') and 'params' in self.__dict__:
+            object.__setattr__(self, 'params', None)
+        object.__setattr__(self, name, value)
+
+    def forward(self, time_in_years):
+        return self.underlying * np.exp(self.risk_free * np.asarray(time_in_years, dtype=float))
+
+    # quotes
+    def set_slice(self, time_in_years, strikes, volatility):
+        strikes = np.array(strikes, dtype=float)
+        volatility = np.array(volatility, dtype=float)
+        usable = np.isfinite(volatility) & (volatility > 0)
+        if usable.sum() < 5:
+            raise ValueError('An SVI slice needs at least 5 usable quotes, got {}.'.format(int(usable.sum())))
+        self.quotes[float(time_in_years)] = (strikes[usable], volatility[usable])
+        self.params = None
+
+    def set_slice_prices(self, op_type, time_in_years, strikes, prices):
+        '''Adds a slice from option prices; quotes without an implied vol are dropped.'''
+        solved = ImpliedVolChain(op_type, prices, self.underlying, strikes, self.risk_free, time_in_years)
+        self.set_slice(time_in_years, np.broadcast_to(strikes, solved.volatility.shape), solved.volatility)
+
+    def remove_slice(self, time_in_years):
+        del self.quotes[float(time_in_years)]
+        self.fits.pop(float(time_in_years), None)
+        self.params = None
+
+    # fitting
+    def quote_key(self, expiry):
+        strikes, volatility = self.quotes[expiry]
+        return (float(self.forward(expiry)), strikes.tobytes(), volatility.tobytes())
+
+    def fit_slice(self, expiry):
+        strikes, volatility = self.quotes[expiry]
+        forward = float(self.forward(expiry))
+        log_moneyness = np.log(strikes / forward)
+        weights = None
+        if self.vega_weights:
+            # BSM vega per unit of forward: sqrt(T) * pdf(d1)
+            d1 = (-log_moneyness + 0.5 * volatility**2 * expiry) / (volatility * np.sqrt(expiry))
+            weights = np.sqrt(expiry) * np.exp(-0.5 * d1 * d1)
+            weights = weights / weights.max()
+        previous = self.fits.get(expiry)
+        params = fit_svi(log_moneyness, volatility**2 * expiry, weights,
+                         initial = None if previous is None else previous[1])
+        self.refits += 1
+        return params
+
+    def fit(self):
+        '''Refits the slices whose quotes changed and rebuilds the lookup table.'''
+        if not self.quotes:
+            raise ValueError('The surface has no quotes.')
+        for expiry in self.quotes:
+            key = self.quote_key(expiry)
+            cached = self.fits.get(expiry)
+            if cached is None or cached[0] != key:
+                self.fits[expiry] = (key, self.fit_slice(expiry))
+        expiries = sorted(self.quotes)
+        self.expiries = np.array(expiries)
+        self.params = np.array([self.fits[expiry][1] for expiry in expiries])
+        return self
+
+    def slice_params(self, time_in_years):
+        '''Fitted (a, b, rho, m, sigma) of one expiry.'''
+        if self.params is None:
+            self.fit()
+        return self.fits[float(time_in_years)][1]
+
+    # lookups
+    def total_variance(self, strike, time_in_years):
+        if self.params is None:
+            self.fit()
+        strike, time_in_years = np.broadcast_arrays(np.asarray(strike, dtype=float),
+                                                    np.asarray(time_in_years, dtype=float))
+        log_moneyness = np.log(strike / self.forward(time_in_years))
+
+        # bracketing slices; outside the quoted expiries both ends are the nearest slice.
+        last = len(self.expiries) - 1
+        upper = np.clip(np.searchsorted(self.expiries, time_in_years), 0, last)
+        lower = np.clip(upper - 1, 0, last)
+        lower = np.where(time_in_years <= self.expiries[0], 0, lower)
+        upper = np.where(time_in_years >= self.expiries[-1], last, upper)
+
+        w_lower = svi_total_variance(self.params[lower].T, log_moneyness)
+        w_upper = svi_total_variance(self.params[upper].T, log_moneyness)
+        t_lower, t_upper = self.expiries[lower], self.expiries[upper]
+        same = upper == lower
+        weight = np.where(same, 0.0, (time_in_years - t_lower) / np.where(same, 1.0, t_upper - t_lower))
+        inside = w_lower + weight * (w_upper - w_lower)
+        # constant implied vol beyond the quoted expiries: scale total variance with T.
+        outside = w_lower * time_in_years / t_lower
+        return np.where(same, outside, inside)
+
+    def volatility(self, strike, time_in_years):
+        '''Implied volatility for arrays of strike / expiry pairs.'''
+        time_in_years = np.asarray(time_in_years, dtype=float)
+        return np.sqrt(np.maximum(self.total_variance(strike, time_in_years), 0.0) / time_in_years)
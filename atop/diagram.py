@@ -1,19 +1,126 @@
+import numpy as np
+
+
+class PayoffAsset:
+    '''One leg of a strategy for PayoffDiagram.
+
+    Follows the asset descriptions in 'building opsport.md':
+        'Call' / 'Put' -- strike and premium price of the option
+        'Stock'        -- strike is the price paid (or earned shorting), price is the broker fee
+        'Bond'         -- zero-coupon risk-free note, strike is the principal and price the
+                          rate earned over the holding period
+    trade_position is 'Long' or 'Short' and quantity scales the leg.'''
+    __slots__ = ('asset_type', 'trade_position', 'strike', 'price', 'quantity')
+
+    def __init__(self, asset_type, trade_position, strike, price, quantity = 1):
+        self.asset_type = asset_type
+        self.trade_position = trade_position
+        self.strike = strike
+        self.price = price
+        self.quantity = quantity
+
+    def __repr__(self):
+        return '{} {} x{} (strike {}, price {})'.format(self.trade_position, self.asset_type,
+                                                       self.quantity, self.strike, self.price)
+
+    def sign(self):
+        return -1 if self.trade_position == 'Short' else 1
+
+
 class PayoffDiagram:
     '''Build payoff diagram object.
-    
+
     Given a set of assets (a strategy), calculates the payoff diagram.
-    Great for visualizing option strategies.'''
-    def __init__(self, asset_list):
+    Great for visualizing option strategies.
+
+    asset_list holds PayoffAsset legs. Net payoffs (profits) of every leg are
+    evaluated over the whole underlying_values grid in one broadcast NumPy pass,
+    so dense grids are cheap. The default grid runs from 0 to twice the largest
+    strike.
+
+    Every strategy of these assets is piecewise linear in the underlying with
+    kinks only at option strikes, so breakevens, max_profit and max_loss are
+    found exactly from the kinks and the slope past the last one, not from the
+    grid. Unbounded profit or loss shows up as +/- inf.'''
+    def __init__(self, asset_list, underlying_values = None):
         self.asset_list = asset_list
+        if underlying_values is None:
+            top = max([asset.strike for asset in asset_list if asset.asset_type != 'Bond'] or [50.0])
+            underlying_values = np.linspace(0, 2 * top, 1001)
+        self.underlying_values = np.asarray(underlying_values, dtype=float)
 
         self.asset_payoffs = self.calc_asset_payoffs()
         self.strategy_payoffs = self.calc_strategy_payoffs()
 
+        self.breakevens, self.max_profit, self.max_loss = self.calc_extremes()
+
+    def leg_arrays(self):
+        # columns of per-leg values, ready to broadcast against the grid.
+        legs = self.asset_list
+        kinds = np.array([asset.asset_type for asset in legs])
+        signs = np.array([asset.sign() * asset.quantity for asset in legs], dtype=float)
+        strikes = np.array([asset.strike for asset in legs], dtype=float)
+        prices = np.array([asset.price for asset in legs], dtype=float)
+        return kinds, signs, strikes, prices
+
+    def payoffs_at(self, underlying_values):
+        '''Net payoffs of every leg at the given underlying values, shape (legs x values).'''
+        kinds, signs, strikes, prices = (column[:, np.newaxis] for column in self.leg_arrays())
+        underlying_values = np.asarray(underlying_values, dtype=float)[np.newaxis, :]
+
+        gross = np.where(kinds == 'Call', np.maximum(underlying_values - strikes, 0.0),
+                np.where(kinds == 'Put', np.maximum(strikes - underlying_values, 0.0),
+                np.where(kinds == 'Stock', underlying_values - strikes,
+                         strikes * prices)))  # a bond earns principal times rate
+        # option premiums are paid long and earned short, broker fees are always paid.
+        costs = np.where((kinds == 'Call') | (kinds == 'Put'), signs * prices,
+                np.where(kinds == 'Stock', np.abs(signs) * prices, 0.0))
+        return signs * gross - costs
+
     def calc_asset_payoffs(self):
         '''Returns payoffs for each asset.'''
-        return NotImplemented
+        return self.payoffs_at(self.underlying_values)
 
     def calc_strategy_payoffs(self):
         '''Returns payoffs for the entire strategy'''
-        return NotImplemented
-        
\ No newline at end of file
+        return self.asset_payoffs.sum(axis=0)
+
+    def calc_extremes(self):
+        '''Returns (breakevens, max profit, max loss) over underlying values in [0, inf).'''
+        kinds, signs, strikes, prices = self.leg_arrays()
+        options = (kinds == 'Call') | (kinds == 'Put')
+        points = np.unique(np.concatenate(([0.0], strikes[options])))
+        values = self.payoffs_at(points).sum(axis=0)
+
+        # past the last strike only calls and stock still move with the underlying.
+        tail_slope = signs[(kinds == 'Call') | (kinds == 'Stock')].sum()
+
+        max_profit = np.inf if tail_slope > 0 else values.max()
+        max_loss = -np.inf if tail_slope < 0 else values.min()
+
+        breakevens = list(points[values == 0])
+        # sign changes inside each linear piece
+        left, right = values[:-1], values[1:]
+        crossing = (left * right) < 0
+        breakevens.extend(points[:-1][crossing]
+                          - left[crossing] * (points[1:][crossing] - points[:-1][crossing])
+                          / (right[crossing] - left[crossing]))
+        # and past the last strike
+        if values[-1] * tail_slope < 0:
+            breakevens.append(points[-1] - values[-1] / tail_slope)
+        return np.unique(breakevens), max_profit, max_loss
+
+    def plot(self, show = True):
+        '''Plots every leg and the strategy. Needs matplotlib.'''
+        import matplotlib.pyplot as plt
+
+        for asset, payoffs in zip(self.asset_list, self.asset_payoffs):
+            plt.plot(self.underlying_values, payoffs, linestyle=':', label=repr(asset))
+        plt.plot(self.underlying_values, self.strategy_payoffs, label='Strategy')
+        plt.axhline(y=0, color='r', linestyle='--')
+        plt.xlabel('Underlying Value')
+        plt.ylabel('Profit')
+        plt.legend()
+        plt.grid(True)
+        if show:
+            plt.show(block = True)
@@ -0,0 +1,151 @@
+from math import exp
+import numpy as np
+
+
+class CrankNicolson:
+    '''Finite-difference (Crank-Nicolson) solution of the Black-Scholes-Merton PDE.
+
+    Same parameter conventions as BsmNode / NPeriodBOPM. Solves for the option
+    value on a whole uniform grid of spot levels at once, so price, delta, gamma
+    and theta are available for every spot from one solve:
+        spots  -- the spot grid, 0 to spot_max in nspots steps. The grid is nudged
+                  so today's underlying sits exactly on a node.
+        values, delta, gamma, theta -- arrays over spots at valuation time
+        price  -- the value at today's underlying
+
+    Each time step is one O(nspots) tridiagonal (banded) solve. The first
+    rannacher_steps steps are fully implicit, which damps the oscillations a
+    kinked payoff otherwise leaves in gamma.
+
+    exercise = 'American' enforces early exercise with the penalty method: each
+    step re-solves with a large penalty on nodes below intrinsic value until the
+    set of exercised nodes stops changing.'''
+    def __init__(self, op_type, underlying, strike, volatility, risk_free, time_in_years,
+                 nspots = 400, ntimes = 400, spot_max = None, exercise = 'European',
+                 rannacher_steps = 2, penalty = 1e8, max_penalty_iterations = 50):
+        self.op_type = op_type
+        self.underlying = underlying
+        self.strike = strike
+        self.volatility = volatility
+        self.risk_free = risk_free
+        self.time_in_years = time_in_years
+        self.nspots = nspots
+        self.ntimes = ntimes
+        self.exercise = exercise
+        self.rannacher_steps = rannacher_steps
+        self.penalty = penalty
+        self.max_penalty_iterations = max_penalty_iterations
+
+        # internal calculations
+        self.deltatime = self.time_in_years / self.ntimes
+        self.spots = self.spots_calc(spot_max)
+        self.deltaspot = self.spots[1] - self.spots[0]
+        self.payoff = self.payoff_calc()
+
+        self.values, self.previous_values = self.solve()
+        self.delta, self.gamma, self.theta = self.greeks_calc()
+        self.price = self.price_at(self.underlying)
+
+    def __repr__(self):
+        return '\nCrank-Nicolson grid for a {} option: {} spots x {} time steps.'.format(
+            self.op_type, self.nspots + 1, self.ntimes)
+
+    def spots_calc(self, spot_max):
+        if spot_max is None:
+            # wide enough that the far boundary sits several standard deviations out.
+            spot_max = max(self.underlying, self.strike) * exp(5 * self.volatility * self.time_in_years**0.5)
+        step = spot_max / self.nspots
+        step = self.underlying / max(1, round(self.underlying / step))
+        return step * np.arange(self.nspots + 1)
+
+    def payoff_calc(self):
+        if self.op_type == 'Call':
+            return np.maximum(self.spots - self.strike, 0.0)
+        return np.maximum(self.strike - self.spots, 0.0)
+
+    def boundary_calc(self, time_left):
+        '''Option values at the spot = 0 and spot = spot_max ends with time_left to expiry.'''
+        american = self.exercise == 'American'
+        pv_strike = self.strike if american else self.strike * exp(-self.risk_free * time_left)
+        if self.op_type == 'Call':
+            return 0.0, self.spots[-1] - pv_strike
+        return pv_strike, 0.0
+
+    def coefficients_calc(self):
+        # sub, main and super diagonals of the spatial operator times deltatime, interior nodes.
+        i = np.arange(1, self.nspots)
+        sigma2 = (self.volatility * i)**2
+        sub = 0.5 * self.deltatime * (sigma2 - self.risk_free * i)
+        main = -self.deltatime * (sigma2 + self.risk_free)
+        sup = 0.5 * self.deltatime * (sigma2 + self.risk_free * i)
+        return sub, main, sup
+
+    def solve(self):
+        from scipy.linalg import solve_banded
+
+        sub, main, sup = self.coefficients_calc()
+        values = self.payoff.copy()
+        previous = values
+        american = self.exercise == 'American'
+        interior = slice(1, self.nspots)
+        intrinsic = self.payoff[interior]
+
+        for step in range(self.ntimes):
+            time_left = (step + 1) * self.deltatime
+            # theta = 1 is fully implicit (Rannacher start-up), 1/2 is Crank-Nicolson.
+            theta = 1.0 if step < self.rannacher_steps else 0.5
+            explicit = 1 - theta
+
+            rhs = values[interior] + explicit * (sub * values[:-2] + main * values[interior] + sup * values[2:])
+            low, high = self.boundary_calc(time_left)
+            rhs[0] += theta * sub[0] * low
+            rhs[-1] += theta * sup[-1] * high
+
+            banded = np.zeros((3, self.nspots - 1))
+            banded[0, 1:] = -theta * sup[:-1]
+            banded[1] = 1 - theta * main
+            banded[2, :-1] = -theta * sub[1:]
+
+            new_values = solve_banded((1, 1), banded, rhs)
+            if american:
+                new_values = self.penalty_calc(solve_banded, banded, rhs, new_values, intrinsic)
+
+            previous = values
+            values = np.empty_like(values)
+            values[0], values[-1] = low, high
+            values[interior] = new_values
+        return values, previous
+
+    def penalty_calc(self, solve_banded, banded, rhs, values, intrinsic):
+        '''Penalty iteration: nodes below intrinsic value are pulled onto it.'''
+        active = values < intrinsic
+        for _ in range(self.max_penalty_iterations):
+            weights = np.where(active, self.penalty, 0.0)
+            penalised = banded.copy()
+            penalised[1] += weights
+            values = solve_banded((1, 1), penalised, rhs + weights * intrinsic)
+            new_active = values < intrinsic
+            if np.array_equal(new_active, active):
+                break
+            active = new_active
+        return np.maximum(values, intrinsic)
+
+    def greeks_calc(self):
+        delta = np.gradient(self.values, self.deltaspot)
+        gamma = np.gradient(delta, self.deltaspot)
+        # theta per year, from the last step back to valuation time
+        theta = (self.previous_values - self.values) / self.deltatime
+        return delta, gamma, theta
+
+    def price_at(self, spots):
+        '''Values at arbitrary spot levels, interpolated from the grid.'''
+        return np.interp(spots, self.spots, self.values)
+
+    def greeks_at(self, spots):
+        '''(delta, gamma, theta) at arbitrary spot levels, interpolated from the grid.'''
+        return (np.interp(spots, self.spots, self.delta),
+                np.interp(spots, self.spots, self.gamma),
+                np.interp(spots, self.spots, self.theta))
+
+    def get_price(self):
+        return self.price
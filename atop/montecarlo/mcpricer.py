@@ -0,0 +1,155 @@
+from math import exp, sqrt
+import numpy as np
+
+from atop.blackscholes.bsmchain import bsm_chain_price
+
+
+class RunningMoments:
+    '''Streaming means and (co)variances of a payoff y and a control x.
+
+    Chunks are merged with Chan's parallel update, so millions of samples can be
+    folded in without keeping them or losing precision to naive sums of squares.'''
+    def __init__(self):
+        self.count = 0
+        self.mean_y = 0.0
+        self.mean_x = 0.0
+        self.m_yy = 0.0
+        self.m_xx = 0.0
+        self.m_xy = 0.0
+
+    def update(self, y, x = None):
+        if x is None:
+            x = np.zeros_like(y)
+        n = y.size
+        mean_y = y.mean()
+        mean_x = x.mean()
+        dy = y - mean_y
+        dx = x - mean_x
+        total = self.count + n
+        delta_y = mean_y - self.mean_y
+        delta_x = mean_x - self.mean_x
+        weight = self.count * n / total
+        self.m_yy += dy @ dy + delta_y * delta_y * weight
+        self.m_xx += dx @ dx + delta_x * delta_x * weight
+        self.m_xy += dy @ dx + delta_y * delta_x * weight
+        self.mean_y += delta_y * n / total
+        self.mean_x += delta_x * n / total
+        self.count = total
+
+
+class MonteCarloPricer:
+    '''Monte Carlo pricing of (path-dependent) options on a geometric Brownian motion.
+
+    Same parameter conventions as BsmNode / NPeriodBOPM: annual volatility, a
+    continuously compounded annual risk-free rate and time_in_years. Paths are
+    monitored at nperiods equally spaced dates.
+
+    payoff is a function of a (paths x nperiods) array of simulated underlying
+    values (today's value not included) returning one payoff per path. The
+    default is the plain European payoff on the last column.
+
+    Paths are generated chunk_size at a time and folded into running moments,
+    so memory stays at one chunk however many paths are run. Variance reduction:
+        antithetic      -- every normal draw z is also used as -z, pairs are averaged
+        control_variate -- the discounted European payoff of the same op_type and
+                           strike is the control, its Black-Scholes-Merton price the
+                           known mean; the coefficient is estimated from the paths
+    Simulation stops at npaths, or as soon as the standard error reaches
+    target_error when one is given.
+
+    Results: price, standard_error, paths_used.'''
+    def __init__(self, op_type, underlying, strike, volatility, risk_free, time_in_years,
+                 nperiods = 1, npaths = 1_000_000, chunk_size = 100_000,
+                 antithetic = False, control_variate = False, target_error = None,
+                 payoff = None, seed = None, trade_position = 'Long'):
+        self.op_type = op_type
+        self.underlying = underlying
+        self.strike = strike
+        self.volatility = volatility
+        self.risk_free = risk_free
+        self.time_in_years = time_in_years
+        self.nperiods = nperiods
+        self.npaths = npaths
+        self.chunk_size = chunk_size
+        self.antithetic = antithetic
+        self.control_variate = control_variate
+        self.target_error = target_error
+        self.payoff = payoff if payoff is not None else self.european_payoff
+        self.seed = seed
+        self.trade_position = trade_position  # by default is long. This does NOT affect calculations.
+
+        if self.npaths < (2 if self.antithetic else 1):
+            # antithetic samples are pairs of paths, fewer than one sample would price nothing.
+            raise ValueError('npaths must be at least {} with antithetic = {}, got {}.'.format(
+                2 if self.antithetic else 1, self.antithetic, self.npaths))
+
+        # internal calculations
+        self.deltatime = self.time_in_years / self.nperiods
+        self.discount = exp(-self.risk_free * self.time_in_years)
+        self.drift = (self.risk_free - (self.volatility**2)/2) * self.deltatime
+        self.diffusion = self.volatility * sqrt(self.deltatime)
+        if self.control_variate:
+            self.control_mean = float(bsm_chain_price(self.op_type == 'Call', self.underlying, self.strike,
+                                                      self.volatility, self.risk_free, self.time_in_years))
+
+        self.moments = RunningMoments()
+        self.price, self.standard_error = self.simulate()
+        self.paths_used = self.moments.count * (2 if self.antithetic else 1)
+
+    def __repr__(self):
+        return '\nMonte Carlo {} option: {} +/- {} (1 s.e.) from {} paths.'.format(
+            self.op_type, self.price, self.standard_error, self.paths_used)
+
+    def european_payoff(self, paths):
+        if self.op_type == 'Call':
+            return np.maximum(paths[:, -1] - self.strike, 0.0)
+        return np.maximum(self.strike - paths[:, -1], 0.0)
+
+    def paths_calc(self, normals):
+        # log-Euler steps of the GBM are exact, so any nperiods prices European payoffs without bias.
+        log_paths = np.cumsum(self.drift + self.diffusion * normals, axis=1)
+        return self.underlying * np.exp(log_paths)
+
+    def sample_calc(self, rng, size):
+        '''Discounted payoff (and control) samples for one chunk.'''
+        normals = rng.standard_normal((size, self.nperiods))
+        paths = self.paths_calc(normals)
+        y = self.discount * self.payoff(paths)
+        x = self.discount * self.european_payoff(paths) if self.control_variate else None
+        if self.antithetic:
+            mirror = self.paths_calc(-normals)
+            y = 0.5 * (y + self.discount * self.payoff(mirror))
+            if self.control_variate:
+                x = 0.5 * (x + self.discount * self.european_payoff(mirror))
+        return y, x
+
+    def estimate_calc(self):
+        '''Returns (price, standard error) from the moments gathered so far.'''
+        moments = self.moments
+        n = moments.count
+        if not self.control_variate:
+            variance = moments.m_yy / max(n - 1, 1)
+            return moments.mean_y, sqrt(variance / n)
+        beta = moments.m_xy / moments.m_xx if moments.m_xx > 0 else 0.0
+        price = moments.mean_y - beta * (moments.mean_x - self.control_mean)
+        residual = (moments.m_yy - 2 * beta * moments.m_xy + beta * beta * moments.m_xx) / max(n - 2, 1)
+        return price, sqrt(max(residual, 0.0) / n)
+
+    def simulate(self):
+        rng = np.random.default_rng(self.seed)
+        # with antithetic draws a sample is a pair of paths
+        per_sample = 2 if self.antithetic else 1
+        remaining = self.npaths // per_sample
+        chunk = max(1, self.chunk_size // per_sample)
+        price, error = np.nan, np.nan
+        while remaining > 0:
+            size = min(chunk, remaining)
+            self.moments.update(*self.sample_calc(rng, size))
+            remaining -= size
+            price, error = self.estimate_calc()
+            if self.target_error is not None and self.moments.count > 1 and error <= self.target_error:
+                break
+        return price, error
+
+    def get_price(self):
+        return self.price
@@ -1,18 +1,142 @@
 from atop.blackscholes.bsmnode import BsmNode
+import numpy as np
+
+# the values summed across the book, each weighted by the signed position size.
+_TOTALS = ('price', 'delta', 'gamma', 'theta')
+
 
 class OptionPortfolio:
-    '''Main entry point for users?'''
-    
+    '''Main entry point for users?
+
+    Holds a book of option positions (BsmNode-like assets) and keeps running,
+    position-weighted totals of price, delta, gamma and theta. Totals are updated
+    in O(1) on every add, remove or reprice, so a risk query never rescans the
+    book. Totals are also bucketed by (underlying, expiry): the underlying is the
+    symbol passed to add_asset and the expiry is the asset's time_in_years. A
+    position added without a symbol is bucketed under the asset itself, so
+    get_bucket(asset, expiry) finds it. Repricing never moves a position to
+    another underlying, only to another expiry when time_in_years changes.
+
+    Position size is quantity, negated when the asset's trade position is 'Short'.
+
+    Change an asset's inputs through reprice_asset, not directly. A directly
+    modified asset reprices itself but the portfolio totals will not follow.'''
+
     def __init__(self):
-        self.portfolio = []
+        self.portfolio = {}  # id(asset) -> [asset, quantity, bucket key, contribution]
+        self.totals = self.empty_totals()
+        self.buckets = {}  # bucket key -> totals, plus a 'positions' count
+
+    def __len__(self):
+        return len(self.portfolio)
+
+    def __iter__(self):
+        return (entry[0] for entry in self.portfolio.values())
+
+    def __contains__(self, asset):
+        return id(asset) in self.portfolio
+
+    def empty_totals(self):
+        return dict.fromkeys(_TOTALS, 0.0)
+
+    def position_size(self, asset, quantity):
+        if asset.get_trade_position() == 'Short':
+            return -quantity
+        return quantity
 
-    def add_asset(self, asset):
-        self.portfolio.append(asset)
-        
+    def contribution_calc(self, asset, quantity):
+        size = self.position_size(asset, quantity)
+        return {name: size * getattr(asset, name) for name in _TOTALS}
+
+    def add_asset(self, asset, quantity = 1, symbol = None):
+        if id(asset) in self.portfolio:
+            raise ValueError('asset is already in the portfolio, use reprice_asset to change its quantity')
+        # the underlying value moves with every reprice, so it can't name a bucket.
+        key = (id(asset) if symbol is None else symbol, asset.time_in_years)
+        contribution = self.contribution_calc(asset, quantity)
+        self.portfolio[id(asset)] = [asset, quantity, key, contribution]
+        self.apply(key, contribution, 1)
+
+
+    def entry(self, asset):
+        try:
+            return self.portfolio[id(asset)]
+        except KeyError:
+            raise ValueError('asset is not in the portfolio') from None
 
     def remove_asset(self, asset):
-        self.portfolio.remove(asset)
+        asset, quantity, key, contribution = self.entry(asset)
+        del self.portfolio[id(asset)]
+        self.apply(key, contribution, -1)
+
+    def reprice_asset(self, asset, quantity = None, **changes):
+        '''Changes an asset's inputs (and/or the position quantity) and updates the totals.
+
+        Keyword arguments are asset attributes, for example underlying = 101.5. When
+        a change or the repricing fails the asset's inputs are restored and the
+        totals are left untouched.'''
+        entry = self.entry(asset)
+        previous = {name: getattr(asset, name) for name in changes}
+        new_quantity = entry[1] if quantity is None else quantity
+        try:
+            for name, value in changes.items():
+                setattr(asset, name, value)
+            contribution = self.contribution_calc(asset, new_quantity)
+        except Exception:
+            # leave the asset as it was, so it still matches its contribution to the totals.
+            for name, value in previous.items():
+                setattr(asset, name, value)
+            raise
+        self.apply(entry[2], entry[3], -1)
+        entry[1] = new_quantity
+        entry[2] = (entry[2][0], asset.time_in_years)
+        entry[3] = contribution
+        self.apply(entry[2], entry[3], 1)
+
+    def apply(self, key, contribution, direction):
+        # direction is 1 to add a contribution and -1 to take it back out.
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = dict(self.empty_totals(), positions = 0)
+        for name in _TOTALS:
+            self.totals[name] += direction * contribution[name]
+            bucket[name] += direction * contribution[name]
+        bucket['positions'] += direction
+        if bucket['positions'] == 0:
+            del self.buckets[key]
+
+    def recalculate(self):
+        '''Rebuilds every total from scratch, O(n). Clears any floating-point drift
+        that builds up over a long run of incremental updates.'''
+        self.totals = self.empty_totals()
+        self.buckets = {}
+        for entry in self.portfolio.values():
+            entry[3] = self.contribution_calc(entry[0], entry[1])
+            self.apply(entry[2], entry[3], 1)
+
+    def to_arrays(self):
+        '''Returns the book as NumPy arrays (one entry per position) for vectorized engines.
+
+        Keys: op_type, underlying, strike, volatility, risk_free, time_in_years, dividend_yield, size.
+        Assets without a dividend_yield attribute count as paying none.'''
+        entries = list(self.portfolio.values())
+        arrays = {name: np.array([getattr(entry[0], name) for entry in entries])
+                  for name in ('op_type', 'underlying', 'strike', 'volatility', 'risk_free', 'time_in_years')}
+        arrays['dividend_yield'] = np.array([getattr(entry[0], 'dividend_yield', 0.0) for entry in entries],
+                                            dtype=float)
+        arrays['size'] = np.array([self.position_size(entry[0], entry[1]) for entry in entries], dtype=float)
+        return arrays
+
+    def get_totals(self):
+        return dict(self.totals)
+
+    def get_bucket(self, underlying, expiry):
+        '''Totals of one (symbol, expiry) bucket; underlying may also be an asset added without a symbol.'''
+        if underlying in self:
+            underlying = id(underlying)
+        bucket = self.buckets.get((underlying, expiry))
+        if bucket is None:
+            return dict(self.empty_totals(), positions = 0)
+        return dict(bucket)
 
-    
 
-    
\ No newline at end of file
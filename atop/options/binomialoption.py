@@ -1,3 +1,6 @@
+from atop.util import instrument
+
+
 class BinomialOption:
     '''Creates a single-period two-state option object.
         
@@ -25,7 +28,13 @@ class BinomialOption:
         self.up_payoff = up_payoff
         self.down_payoff = down_payoff
         self.overridden = overridden
+        if instrument.sink is None:
+            self.replication_calc()
+        else:
+            instrument.count('BinomialOption', 'periods')
+            instrument.timed('BinomialOption', 'replication', self.replication_calc)
 
+    def replication_calc(self):
         self.hedge_ratio =  (self.up_payoff - self.down_payoff)/(self.up_price - self.down_price)
         self.rf_units = (1/(1+self.risk_free))*(self.up_payoff-(self.hedge_ratio*self.up_price))
 
@@ -1,48 +1,162 @@
+import copy
 from math import exp, sqrt
 import numpy as np
 
+from atop.blackscholes.bsmchain import bsm_chain_price
+from atop.util import instrument
+
+# levels whose option values a rollback keeps for the lattice greeks (the extended tree reads level 4).
+_KEPT_LEVELS = 4
+
 
 class NPeriodBOPM:
+    '''N-period binomial option pricing model.
+
+    Builds the terminal underlying values and payoffs as NumPy vectors and works
+    back to today's price with vectorized backward induction.
+
+    exercise = 'American' compares the continuation value with the intrinsic
+    value at every node on the way back. The underlying values of each level are
+    stepped back in place, so memory stays O(nperiods). With find_boundary = True
+    the early-exercise boundary (the critical underlying value per level, nan
+    where no node exercises) is stored in exercise_boundary.
+
+    Chain mode: when strike and/or op_type are sequences, every contract shares
+    the one lattice. The payoffs become a (nodes x contracts) matrix that is
+    carried through a single backward pass, so price is an array with one
+    entry per contract and price_vector / exercise_boundary gain a contract axis.
+
+    acceleration smooths out the odd-even oscillation of the lattice price:
+        'BBS'        -- the last step is replaced with Black-Scholes values
+                        (Broadie-Detemple binomial Black-Scholes).
+        'Richardson' -- price is extrapolated from this n-step run and a
+                        companion run of about 2n steps with the same parity
+                        (2n, or 2n + 1 for odd n), weighted for the order of
+                        the lattice: error ~ 1/n**2 for Leisen-Reimer, 1/n
+                        otherwise. Raw Jarrow / Cox prices oscillate between
+                        odd and even n, so each end is the average of two
+                        neighbouring step counts first (four runs in all).
+                        Not available for Trinomial, whose raw error swings
+                        with the strike's place between nodes; use BBSR.
+        'BBSR'       -- both: Richardson extrapolation of two BBS runs.
+    The lattice attributes (price_vector, exercise_boundary, ...) always belong
+    to the n-step run; only price is extrapolated.
+
+    factor_method picks the lattice:
+        'Jarrow'    -- Jarrow-Rudd binomial factors.
+        'Cox'       -- Cox-Ross-Rubinstein binomial factors.
+        'Leisen'    -- Leisen-Reimer binomial factors (Peizer-Pratt inversion).
+                       Converges at second order without oscillation. Needs an
+                       odd step count, so an even nperiods is bumped up by one.
+                       The lattice is centred on the strike, so a chain must
+                       share one strike. Not combined with BBS / BBSR.
+        'Trinomial' -- recombining trinomial lattice (Boyle) with 2i + 1 nodes
+                       at level i and a middle_neutral probability.
+
+    delta, gamma and theta come from the same rollback: the option values of
+    the first levels are kept in level_values on the way back (greeks = 'tree').
+    greeks = 'extended' reads them off an extended tree instead (one extra
+    rollback), greeks = None skips them. vega_calc bumps volatility on a lattice
+    set up like this one; rho_calc bumps risk_free on this lattice's own nodes
+    (only the probabilities and the discounting move), since rebuilding a
+    Jarrow-Rudd lattice at another rate would shift every node against the strike.'''
 
     def __init__(self, op_type, 
                         underlying, strike, 
                         volatility, risk_free, 
                         nperiods, time_in_years, 
                         factor_method = 'Jarrow',
-                        trade_position = 'Long' 
+                        trade_position = 'Long',
+                        exercise = 'European',
+                        find_boundary = False,
+                        acceleration = None,
+                        greeks = 'tree'
                         ):
         
         self.op_type = op_type
         self.underlying = underlying
         self.strike = strike
+        self.chain = np.ndim(strike) > 0 or np.ndim(op_type) > 0
+        if self.chain:
+            # one column per contract, all sharing the lattice.
+            self.op_type, self.strike = np.broadcast_arrays(np.asarray(op_type),
+                                                            np.asarray(strike, dtype=float))
         self.volatility = volatility
         self.risk_free = risk_free
         self.nperiods = nperiods
         self.time_in_years = time_in_years
         self.factor_method = factor_method
         self.trade_position = trade_position
+        self.exercise = exercise  # 'European' or 'American'
+        self.find_boundary = find_boundary
+        self.acceleration = acceleration  # None, 'BBS', 'Richardson' or 'BBSR'
+        self.greeks = greeks  # 'tree' or 'extended'
+
+        if self.factor_method == 'Leisen':
+            if self.chain and np.unique(self.strike).size > 1:
+                raise ValueError('Leisen-Reimer lattices are centred on one strike, chain strikes must match.')
+            if self.acceleration in ('BBS', 'BBSR'):
+                # the factors are built for the full step count; the shortened BBS tree would be off-centre.
+                raise ValueError('BBS acceleration does not apply to Leisen-Reimer lattices, which already converge smoothly.')
+            if self.nperiods % 2 == 0:
+                self.nperiods += 1  # Peizer-Pratt inversion wants an odd number of steps
+        if self.factor_method == 'Trinomial' and self.acceleration == 'Richardson':
+            # the raw trinomial error moves with where the strike falls between nodes, it is not c / n.
+            raise ValueError('Richardson extrapolation of raw trinomial prices is unreliable, use BBSR.')
 
         # internal calculations
         self.deltatime = self.__deltatime_calc()
+        self.is_call = np.asarray(self.op_type) == 'Call'
+        self.sign = np.where(self.is_call, 1.0, -1.0)  # call payoffs are S - K, puts are K - S
+
+        with instrument.phase('NPeriodBOPM', 'factors'):
+            # when using Jarrow-Rudd specification
+            if self.factor_method == 'Jarrow':
+                self.upfactor = self.__jarrow_calc()[0]
+                self.downfactor = self.__jarrow_calc()[1]
+                self.up_neutral = self.__jarrow_calc()[2]
+                self.down_neutral = self.__jarrow_calc()[3]
+
+            # when using Cox-Ross-Rubinstein specification:
+            if self.factor_method == 'Cox':
+                self.upfactor = self.__cox_calc()[0]
+                self.downfactor = self.__cox_calc()[1]
+                self.up_neutral = self.__cox_calc()[2]
+                self.down_neutral = self.__cox_calc()[3]
 
-        # when using Jarrow-Rudd specification
-        if self.factor_method == 'Jarrow':
-            self.upfactor = self.__jarrow_calc()[0]
-            self.downfactor = self.__jarrow_calc()[1]
-            self.up_neutral = self.__jarrow_calc()[2]
-            self.down_neutral = self.__jarrow_calc()[3]
-
-        # when using Cox-Ross-Rubinstein specification:
-        if self.factor_method == 'Cox':
-            self.upfactor = self.__cox_calc()[0]
-            self.downfactor = self.__cox_calc()[1]
-            self.up_neutral = self.__cox_calc()[2]
-            self.down_neutral = self.__cox_calc()[3]
-
-        self.underlying_vector = self.__underlying_vector_calc()
-        self.payoff_vector = self.__payoff_vector_calc()
-        self.price_vector = self.__price_calc()
+            # when using Leisen-Reimer specification:
+            if self.factor_method == 'Leisen':
+                self.upfactor, self.downfactor, self.up_neutral, self.down_neutral = self.__leisen_calc()
+
+            # when using a trinomial lattice:
+            self.trinomial = self.factor_method == 'Trinomial'
+            if self.trinomial:
+                (self.upfactor, self.downfactor,
+                 self.up_neutral, self.middle_neutral, self.down_neutral) = self.__trinomial_calc()
+
+        with instrument.phase('NPeriodBOPM', 'lattice'):
+            self.underlying_vector = self.__underlying_vector_calc()
+        with instrument.phase('NPeriodBOPM', 'payoff'):
+            self.payoff_vector = self.__payoff_vector_calc()
+        self.exercise_boundary = None  # filled by __price_calc when find_boundary is set
+        self.level_values = {}  # option values of the first levels, kept by __price_calc for the greeks
+        with instrument.phase('NPeriodBOPM', 'backward_induction'):
+            self.price_vector = self.__price_calc()
         self.price = self.price_vector[0]
+        if self.acceleration in ('Richardson', 'BBSR'):
+            self.price = self.__richardson_calc(self.price, lambda nperiods: self.__companion(nperiods).price)
+
+        if self.greeks == 'tree':
+            self.delta, self.gamma, self.theta = self.tree_greeks_calc()
+        elif self.greeks == 'extended':
+            self.delta, self.gamma, self.theta = self.extended_greeks_calc()
+        else:
+            self.delta = self.gamma = self.theta = None
+
+        if instrument.sink is not None:
+            instrument.count('NPeriodBOPM', 'lattices')
+            instrument.value('NPeriodBOPM', 'terminal_nodes', len(self.underlying_vector))
+            instrument.value('NPeriodBOPM', 'contracts', np.size(self.strike))
 
     # internal calc
 
@@ -80,7 +194,44 @@ class NPeriodBOPM:
 
         return (up_factor, dn_factor, up_neutral, dn_neutral)
 
+    def __leisen_calc(self):
+        strike = float(np.ravel(self.strike)[0])
+        d1 = ((np.log(self.underlying/strike) + (self.risk_free + (self.volatility**2)/2)*self.time_in_years)
+              / (self.volatility * sqrt(self.time_in_years)))
+        d2 = d1 - self.volatility * sqrt(self.time_in_years)
+
+        # The risk-neutral probabilites come straight from the inversion
+        up_neutral = self.__peizer_pratt(d2)
+        up_factor = exp(self.risk_free * self.deltatime) * self.__peizer_pratt(d1) / up_neutral
+        dn_factor = (exp(self.risk_free * self.deltatime) - up_neutral * up_factor) / (1 - up_neutral)
+        dn_neutral = 1-up_neutral
+
+        return (up_factor, dn_factor, up_neutral, dn_neutral)
+
+    def __peizer_pratt(self, z):
+        # Peizer-Pratt method 2 inversion of the normal distribution
+        n = self.nperiods
+        spread = z / (n + 1/3 + 0.1/(n + 1))
+        return 0.5 + np.sign(z) * 0.5 * sqrt(1 - exp(-(spread**2) * (n + 1/6)))
+
+    def __trinomial_calc(self):
+        up_factor = exp(self.volatility*sqrt(2*self.deltatime))
+        dn_factor = 1/up_factor
+
+        # The risk-neutral probabilites
+        half_up = exp(self.volatility*sqrt(self.deltatime/2))
+        half_dn = 1/half_up
+        growth = exp(self.risk_free * self.deltatime/2)
+        up_neutral = ((growth - half_dn) / (half_up - half_dn))**2
+        dn_neutral = ((half_up - growth) / (half_up - half_dn))**2
+        mid_neutral = 1 - up_neutral - dn_neutral
+
+        return (up_factor, dn_factor, up_neutral, mid_neutral, dn_neutral)
+
     def __underlying_vector_calc(self):
+        if self.trinomial:
+            # node j sits j - nperiods up-moves away from today, the middle move leaves it unchanged.
+            return self.underlying * self.upfactor ** np.arange(-self.nperiods, self.nperiods + 1)
         # Special thanks to cantaro86 for posting his solution on github
         underlying_values = np.array(
             [(self.underlying * self.upfactor**j * 
@@ -90,24 +241,244 @@ class NPeriodBOPM:
 
     def __payoff_vector_calc(self):
         # Special thanks to cantaro86 for posting his solution on github
-        payoffs = np.zeros(self.nperiods + 1) # get array going
-        if self.op_type == 'Call':
-            payoffs[:] = np.maximum(self.underlying_vector - self.strike, 0.0)
-        else:
-            payoffs[:] = np.maximum(self.strike - self.underlying_vector, 0.0)
-        return payoffs
+        return np.maximum(self.sign * (self.__node_axis(self.underlying_vector) - self.strike), 0.0)
+
+    def __node_axis(self, underlying_values):
+        # in chain mode underlying values run down the rows, contracts across the columns.
+        if self.chain:
+            return underlying_values[:, np.newaxis]
+        return underlying_values
 
     def __price_calc(self):
         # Special thanks to cantaro86 for posting his solution on github
         price_vector = self.payoff_vector
+        american = self.exercise == 'American'
+        bbs = self.acceleration in ('BBS', 'BBSR')
+        if american or bbs:
+            # one buffer of underlying values, stepped back a level at a time in place.
+            underlying_vector = self.underlying_vector.copy()
+        if american:
+            if self.find_boundary:
+                self.exercise_boundary = np.full((self.nperiods + 1,) + np.shape(self.strike), np.nan)
+                self.exercise_boundary[self.nperiods] = self.strike
+        scratch = np.empty_like(price_vector)  # reused every step instead of fresh temporaries
+        last_level = self.nperiods - 1
+        if bbs:
+            # Black-Scholes values one step before maturity replace the last rollback step.
+            last_level -= 1
+            self.__bbs_step(price_vector, underlying_vector, american)
         # find prices
-        for i in range(self.nperiods-1, -1, -1):
-            price_vector[:-1] = (
-                np.exp(-self.risk_free*self.deltatime)
-                * (self.up_neutral * price_vector[1:]
-                    + self.down_neutral * price_vector[:-1]))
+        for i in range(last_level, -1, -1):
+            width = self.__rollback_step(price_vector, scratch, i)
+            if american:
+                self.__underlying_step(underlying_vector, i)
+                self.__early_exercise(i, price_vector[:width], underlying_vector[:width])
+            if i <= _KEPT_LEVELS:
+                self.level_values[i] = price_vector[:width].copy()
         return price_vector
-        
+
+    def __rollback_step(self, price_vector, scratch, level):
+        # discounted expectation over the children of every node at this level, in place.
+        # returns the number of nodes on the level.
+        discount = exp(-self.risk_free*self.deltatime)
+        if self.trinomial:
+            width = 2*level + 1
+            np.multiply(price_vector[2:width+2], discount * self.up_neutral, out=scratch[:width])
+            scratch[:width] += (discount * self.middle_neutral) * price_vector[1:width+1]
+        else:
+            width = level + 1
+            np.multiply(price_vector[1:width+1], discount * self.up_neutral, out=scratch[:width])
+        price_vector[:width] *= discount * self.down_neutral
+        price_vector[:width] += scratch[:width]
+        return width
+
+    def __underlying_step(self, underlying_vector, level):
+        # binomial: a node at level i is its level i+1 down-child divided by the down factor.
+        # trinomial: a node at level i is its level i+1 middle-child, one slot along.
+        if self.trinomial:
+            width = 2*level + 1
+            underlying_vector[:width] = underlying_vector[1:width+1]
+        else:
+            width = level + 1
+            underlying_vector[:width] /= self.downfactor
+        return width
+
+    def __bbs_step(self, price_vector, underlying_vector, american):
+        level = self.nperiods - 1
+        width = self.__underlying_step(underlying_vector, level)
+        price_vector[:width] = bsm_chain_price(self.is_call,
+                                               self.__node_axis(underlying_vector[:width]),
+                                               self.strike, self.volatility,
+                                               self.risk_free, self.deltatime)
+        if american:
+            self.__early_exercise(level, price_vector[:width], underlying_vector[:width])
+        if level <= _KEPT_LEVELS:
+            self.level_values[level] = price_vector[:width].copy()
+
+    def __richardson_calc(self, price, companion_price):
+        # price is this lattice's, companion_price(nperiods) prices the same set-up on another step count.
+        # error ~ c / n**order: (r * P(fine) - P(coarse)) / (r - 1), r = (fine / coarse)**order, cancels c.
+        order = 2 if self.factor_method == 'Leisen' else 1
+        n = self.nperiods
+        if self.acceleration == 'BBSR' or self.factor_method == 'Leisen':
+            coarse, coarse_steps = price, n
+            fine_steps = 2*n + n % 2  # same parity as n (always odd for Leisen-Reimer)
+            fine = companion_price(fine_steps)
+        else:
+            # odd and even step counts sit on opposite sides of the oscillation, their average on neither.
+            coarse = (price + companion_price(n + 1)) / 2
+            fine = (companion_price(2*n) + companion_price(2*n + 1)) / 2
+            coarse_steps, fine_steps = n + 0.5, 2*n + 0.5
+        ratio = (fine_steps / coarse_steps) ** order
+        return (ratio * fine - coarse) / (ratio - 1)
+
+    def __companion(self, nperiods):
+        # the same contract on another step count, for the Richardson extrapolation.
+        return NPeriodBOPM(self.op_type, self.underlying, self.strike,
+                           self.volatility, self.risk_free,
+                           nperiods, self.time_in_years,
+                           factor_method = self.factor_method,
+                           exercise = self.exercise,
+                           acceleration = 'BBS' if self.acceleration == 'BBSR' else None,
+                           greeks = None)
+
+    def __early_exercise(self, level, continuation, underlying_values):
+        # compares continuation value with intrinsic value, in place.
+        underlying_values = self.__node_axis(underlying_values)
+        intrinsic = self.sign * (underlying_values - self.strike)
+        exercised = intrinsic > continuation
+        np.maximum(continuation, intrinsic, out=continuation)
+        if self.exercise_boundary is not None and exercised.any():
+            # calls exercise above the boundary, puts below it.
+            lowest = np.where(exercised, underlying_values, np.inf).min(axis=0)
+            highest = np.where(exercised, underlying_values, -np.inf).max(axis=0)
+            boundary = np.where(self.is_call, lowest, highest)
+            self.exercise_boundary[level] = np.where(np.isfinite(boundary), boundary, np.nan)
+
+    # the greeks
+    def __level_underlying(self, root, level):
+        # underlying values of the nodes at a level, for a lattice starting from root.
+        if self.trinomial:
+            return root * self.upfactor ** np.arange(-level, level + 1)
+        j = np.arange(level + 1)
+        return root * self.upfactor**j * self.downfactor**(level - j)
+
+    def __three_node_greeks(self, underlying_values, option_values):
+        # delta and gamma from three neighbouring nodes at the same time step.
+        s_dn, s_mid, s_up = underlying_values
+        f_dn, f_mid, f_up = option_values
+        delta = (f_up - f_dn) / (s_up - s_dn)
+        gamma = ((f_up - f_mid) / (s_up - s_mid) - (f_mid - f_dn) / (s_mid - s_dn)) / (0.5 * (s_up - s_dn))
+        return delta, gamma
+
+    def __spot_value(self, underlying_values, option_values):
+        # option value at today's underlying, from the three middle nodes of a level.
+        # binomial middle nodes sit at S * (u*d)**k, so a second order expansion moves it to S.
+        middle = len(underlying_values) // 2
+        nodes = slice(middle - 1, middle + 2)
+        delta, gamma = self.__three_node_greeks(underlying_values[nodes], option_values[nodes])
+        shift = self.underlying - underlying_values[middle]
+        return option_values[middle] + delta * shift + 0.5 * gamma * shift**2
+
+    def tree_greeks_calc(self):
+        '''Delta, gamma and theta (per year) from the option values the rollback
+        kept at levels 1 and 2, so they cost nothing beyond the pricing pass.
+
+        Binomial: delta from the two level-1 nodes, gamma from the three level-2
+        nodes and theta from the middle level-2 node, 2 steps on. Trinomial: all
+        three from level 1. Greeks of a lattice too short to reach those levels are nan.
+
+        The middle level-2 node sits at S*u*d, which is S only when u*d == 1
+        (Cox); theta uses the option value at S, interpolated across level 2.'''
+        levels = self.level_values
+        if self.trinomial:
+            if 1 not in levels:
+                return (np.nan, np.nan, np.nan)
+            delta, gamma = self.__three_node_greeks(self.__level_underlying(self.underlying, 1), levels[1])
+            theta = (levels[1][1] - levels[0][0]) / self.deltatime
+            return delta, gamma, theta
+        if 2 not in levels:
+            return (np.nan, np.nan, np.nan)
+        s_dn, s_up = self.__level_underlying(self.underlying, 1)
+        delta = (levels[1][1] - levels[1][0]) / (s_up - s_dn)
+        level_underlying = self.__level_underlying(self.underlying, 2)
+        gamma = self.__three_node_greeks(level_underlying, levels[2])[1]
+        theta = (self.__spot_value(level_underlying, levels[2]) - levels[0][0]) / (2 * self.deltatime)
+        return delta, gamma, theta
+
+    def extended_greeks_calc(self):
+        '''Delta, gamma and theta from an extended tree (Pelsser-Vorst).
+
+        The lattice is started 2 steps (trinomial: 1 step) before today, from
+        an underlying chosen so the middle node of that level is today's
+        underlying. Delta and gamma then come from three nodes at today's date
+        instead of one and two steps later, which mostly tightens gamma (delta
+        is taken over wider spacing), and theta from the option value at today's
+        underlying 2 steps (1 step) on. Costs one extra rollback. Greeks of a
+        lattice too short to reach that later level are nan.'''
+        if self.factor_method == 'Leisen':
+            raise ValueError('Leisen-Reimer factors depend on the step count, there is no extended tree.')
+        extra = 1 if self.trinomial else 2
+        ud = self.upfactor * self.downfactor
+        root = self.underlying if self.trinomial else self.underlying / ud
+        extended = NPeriodBOPM(self.op_type, root, self.strike, self.volatility, self.risk_free,
+                               self.nperiods + extra, self.time_in_years + extra * self.deltatime,
+                               factor_method = self.factor_method,
+                               exercise = self.exercise,
+                               acceleration = 'BBS' if self.acceleration in ('BBS', 'BBSR') else None,
+                               greeks = None)
+        levels = extended.level_values
+        if 2 * extra not in levels:
+            return (np.nan, np.nan, np.nan)
+        today = levels[extra]
+        delta, gamma = self.__three_node_greeks(self.__level_underlying(root, extra), today)
+        later = self.__spot_value(self.__level_underlying(root, 2 * extra), levels[2 * extra])
+        theta = (later - today[1]) / (extra * self.deltatime)
+        return delta, gamma, theta
+
+    def __bumped_price(self, volatility):
+        # same lattice set-up (steps, factor method, exercise, every contract of a chain), another volatility.
+        return NPeriodBOPM(self.op_type, self.underlying, self.strike, volatility, self.risk_free,
+                           self.nperiods, self.time_in_years,
+                           factor_method = self.factor_method,
+                           exercise = self.exercise,
+                           acceleration = self.acceleration,
+                           greeks = None).price
+
+    def __repriced(self, risk_free):
+        # this lattice's nodes at another rate: the probabilities and discounting move, the factors don't.
+        lattice = copy.copy(self)
+        lattice.risk_free = risk_free
+        if self.trinomial:
+            lattice.up_neutral, lattice.middle_neutral, lattice.down_neutral = lattice.__trinomial_calc()[2:]
+        else:
+            lattice.up_neutral = (exp(risk_free * self.deltatime) - self.downfactor) / (self.upfactor - self.downfactor)
+            lattice.down_neutral = 1 - lattice.up_neutral
+        # the copy shares this model's arrays; its rollback must not write into them.
+        lattice.find_boundary = False
+        lattice.exercise_boundary = None
+        lattice.level_values = {}
+        lattice.payoff_vector = lattice.__payoff_vector_calc()
+        return lattice.__price_calc()[0]
+
+    def __rate_bumped_price(self, risk_free):
+        price = self.__repriced(risk_free)
+        if self.acceleration in ('Richardson', 'BBSR'):
+            price = self.__richardson_calc(price, lambda nperiods: self.__companion(nperiods).__repriced(risk_free))
+        return price
+
+    def vega_calc(self, bump = 0.01):
+        '''Central difference vega (per unit of volatility) from two bumped lattices.
+        In chain mode both lattices price every contract, so a whole chain costs two rollbacks.'''
+        return ((self.__bumped_price(self.volatility + bump)
+                 - self.__bumped_price(self.volatility - bump)) / (2 * bump))
+
+    def rho_calc(self, bump = 0.0001):
+        '''Central difference rho (per unit of rate) from two rollbacks over this lattice's
+        nodes, with the up / down factors held fixed.'''
+        return ((self.__rate_bumped_price(self.risk_free + bump)
+                 - self.__rate_bumped_price(self.risk_free - bump)) / (2 * bump))
+
     def get_price(self):
         return self.price
 
@@ -0,0 +1,63 @@
+from atop.options.tree import BinTree
+import numpy as np
+
+
+class ReplicationSchedule:
+    '''Replicating portfolio for every node of an n-period binomial tree.
+
+    Same conventions as BinomialOption: the risk free rate is the simple rate
+    earned over ONE period, and every node's up/down prices are the node's
+    underlying value times upfactor/downfactor.
+
+    Instead of chaining one CallOption/PutOption per node (with the child option
+    prices passed in as override payoffs), the whole tree is solved in a single
+    vectorized backward pass over a BinTree. For every node the schedule holds
+        hedge_ratio  -- units of the underlying held
+        rf_units     -- present value of the risk-free bond position
+        option_price -- hedge_ratio * underlying + rf_units
+    as flat arrays in BinTree layout (node j of level i at index i*(i+1)/2 + j).
+    The last level holds payoffs and nan hedges, since nothing is left to hedge.'''
+    def __init__(self, op_type, stock_price, strike_price, upfactor, downfactor, risk_free, nperiods, exercise = 'European'):
+        self.op_type = op_type
+        self.stock_price = stock_price
+        self.strike_price = strike_price
+        self.upfactor = upfactor
+        self.downfactor = downfactor
+        self.risk_free = risk_free
+        self.nperiods = nperiods
+        self.exercise = exercise
+
+        #risk neutral probabilites, the same at every node of a recombining tree
+        self.up_risk_neutral_prob = ((1+self.risk_free) - self.downfactor)/(self.upfactor - self.downfactor)
+        self.down_risk_neutral_prob = 1-self.up_risk_neutral_prob
+
+        self.tree = BinTree(stock_price, upfactor, downfactor, nperiods)
+        self.tree.plant(op_type, strike_price, exercise)
+        self.rf_units = np.full(self.tree.size, np.nan)
+        self.option_price = self.tree.rollback(self.up_risk_neutral_prob, 1/(1+self.risk_free), self.rf_units)
+
+        self.underlying_values = self.tree.underlying_values
+        self.option_values = self.tree.option_values
+        self.hedge_ratio = self.tree.hedge_ratios
+
+    def __repr__(self):
+        return '\nReplication schedule for a {}-period {} option ({} nodes).'.format(
+            self.nperiods, self.op_type, self.tree.size)
+
+    def node(self, level, position):
+        '''Returns (underlying, option value, hedge ratio, rf units) at one node.'''
+        index = self.tree.index(level, position)
+        return (self.underlying_values[index], self.option_values[index],
+                self.hedge_ratio[index], self.rf_units[index])
+
+    def level(self, level):
+        '''Returns the (underlying, option value, hedge ratio, rf units) arrays of one level.'''
+        here = self.tree.level_slice(level)
+        return (self.underlying_values[here], self.option_values[here],
+                self.hedge_ratio[here], self.rf_units[here])
+
+    def schedule(self):
+        '''Yields (level, underlying, hedge ratio, rf units) for every hedging date, today first.'''
+        for level in range(self.nperiods):
+            underlying, _, hedge, bonds = self.level(level)
+            yield level, underlying, hedge, bonds
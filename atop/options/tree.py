@@ -1,16 +1,174 @@
+import numpy as np
+
+
 class BinTree:
-    def __init__(self):
-        '''Container for structuring and handling all nodes used in an option-like asset. 
-        
-        Creates a generic binomial option tree whose by planting an option.
-        
-        Ha, what?
-        '''
-        
+    '''Container for structuring and handling all nodes used in an option-like asset.
+
+    Creates a generic recombining binomial tree by 'planting' an option in it.
+
+    The tree is array-backed rather than a web of node objects. Every level is
+    laid out one after another in flat float64 buffers: node j of level i
+    (j counts the up-moves, so j = 0 is the all-down node) lives at index
+    i*(i+1)/2 + j. Each buffer holds one value per node:
+        underlying_values -- the underlying asset value
+        option_values     -- the option value (filled by plant and rollback)
+        hedge_ratios      -- the replicating units of the underlying (nan on the last level)
+
+    Memory is 3 * 8 bytes per node, (nperiods+1)(nperiods+2)/2 nodes, so a 10k step
+    tree takes roughly 1.2GB. Binodes is a small view for poking at single nodes.'''
+    def __init__(self, underlying, upfactor, downfactor, nperiods):
+        self.underlying = underlying
+        self.upfactor = upfactor
+        self.downfactor = downfactor
+        self.nperiods = nperiods
+        self.size = (nperiods + 1) * (nperiods + 2) // 2
+
+        self.underlying_values = self.underlying_values_calc()
+        self.option_values = np.full(self.size, np.nan)
+        self.hedge_ratios = np.full(self.size, np.nan)
+
+        # per-node payoff overrides, {level: {position: value}}. Applied on top of
+        # the rolled back value, so they can mimic barriers, caps, call features...
+        self.overrides = {}
+
+        self.op_type = None
+        self.strike = None
+        self.exercise = 'European'
+
+    def __repr__(self):
+        return '\nRecombining binomial tree of {} periods ({} nodes).'.format(self.nperiods, self.size)
+
+    def __len__(self):
+        return self.size
+
+    # indexing
+    def offset(self, level):
+        return level * (level + 1) // 2
+
+    def index(self, level, position):
+        if not 0 <= position <= level <= self.nperiods:
+            raise IndexError('no node at level {}, position {}'.format(level, position))
+        return self.offset(level) + position
+
+    def level_slice(self, level):
+        start = self.offset(level)
+        return slice(start, start + level + 1)
+
+    def node(self, level, position):
+        return Binodes(self, level, position)
+
+    # internal calculations
+    def underlying_values_calc(self):
+        values = np.empty(self.size)
+        ratio = self.upfactor / self.downfactor
+        for level in range(self.nperiods + 1):
+            # S * d**level * (u/d)**j for j up-moves
+            values[self.level_slice(level)] = (self.underlying * self.downfactor**level
+                                               * ratio ** np.arange(level + 1))
+        return values
+
+    def plant(self, op_type, strike, exercise = 'European'):
+        '''Sets the option's payoffs on the last level.
+
+        Any per-node overrides on the last level replace the standard payoff.'''
+        self.op_type = op_type
+        self.strike = strike
+        self.exercise = exercise
+        last = self.level_slice(self.nperiods)
+        self.option_values[last] = self.intrinsic_calc(self.underlying_values[last])
+        self.apply_overrides(self.nperiods)
+
+    def intrinsic_calc(self, underlying_values):
+        if self.op_type == 'Call':
+            return np.maximum(underlying_values - self.strike, 0.0)
+        return np.maximum(self.strike - underlying_values, 0.0)
+
+    def set_payoff(self, level, position, value):
+        '''Overrides the option value at one node. Takes effect on the next plant/rollback.'''
+        self.index(level, position)  # bounds check
+        self.overrides.setdefault(level, {})[position] = value
+
+    def clear_payoff(self, level, position):
+        self.overrides.get(level, {}).pop(position, None)
+
+    def apply_overrides(self, level):
+        level_overrides = self.overrides.get(level)
+        if level_overrides:
+            start = self.offset(level)
+            positions = np.fromiter(level_overrides.keys(), dtype=np.int64)
+            self.option_values[start + positions] = np.fromiter(level_overrides.values(), dtype=float)
+
+    def rollback(self, up_neutral, discount, rf_units = None):
+        '''Works the planted payoffs back to today, one vectorized level at a time.
+
+        up_neutral is the risk-neutral probability of an up-move and discount the
+        one-period discount factor. Fills option_values and hedge_ratios for every
+        node and returns today's option value.
+
+        Pass a buffer of self.size floats as rf_units to also collect the
+        replicating bond position (present value of the risk-free units) per node.'''
+        if self.op_type is None:
+            raise ValueError('plant an option before rolling the tree back')
+        down_neutral = 1 - up_neutral
+        american = self.exercise == 'American'
+        for level in range(self.nperiods - 1, -1, -1):
+            children = self.level_slice(level + 1)
+            child_values = self.option_values[children]
+            child_underlying = self.underlying_values[children]
+            here = self.level_slice(level)
+
+            self.hedge_ratios[here] = ((child_values[1:] - child_values[:-1])
+                                       / (child_underlying[1:] - child_underlying[:-1]))
+            if rf_units is not None:
+                rf_units[here] = discount * (child_values[1:] - self.hedge_ratios[here] * child_underlying[1:])
+            values = discount * (up_neutral * child_values[1:] + down_neutral * child_values[:-1])
+            if american:
+                np.maximum(values, self.intrinsic_calc(self.underlying_values[here]), out=values)
+            self.option_values[here] = values
+            self.apply_overrides(level)
+        return self.option_values[0]
+
+    def get_level(self, level):
+        '''Views (underlying, option value, hedge ratio) for one level. No copies.'''
+        here = self.level_slice(level)
+        return self.underlying_values[here], self.option_values[here], self.hedge_ratios[here]
+
 
 class Binodes:
-    def __init__(self, u_node, d_node):
-        pass
+    '''Lightweight view of one node in a BinTree.
+
+    Holds no values itself, everything is read from (and written to) the tree's buffers.'''
+    __slots__ = ('tree', 'level', 'position', 'index')
+
+    def __init__(self, tree, level, position):
+        self.tree = tree
+        self.level = level
+        self.position = position
+        self.index = tree.index(level, position)
+
+    def __repr__(self):
+        return 'Binodes(level={}, position={}, underlying={}, option_value={})'.format(
+            self.level, self.position, self.underlying, self.option_value)
+
+    @property
+    def underlying(self):
+        return self.tree.underlying_values[self.index]
+
+    @property
+    def option_value(self):
+        return self.tree.option_values[self.index]
+
+    @property
+    def hedge_ratio(self):
+        return self.tree.hedge_ratios[self.index]
 
+    @property
+    def u_node(self):
+        return Binodes(self.tree, self.level + 1, self.position + 1)
 
+    @property
+    def d_node(self):
+        return Binodes(self.tree, self.level + 1, self.position)
 
+    def set_payoff(self, value):
+        self.tree.set_payoff(self.level, self.position, value)
@@ -0,0 +1,206 @@
+'''Process-pool pricing of large contract batches.
+
+ParallelPricer splits a batch of contracts into contiguous chunks and prices
+the chunks on a pool of worker processes. Nothing is pickled per contract:
+the inputs are copied once into multiprocessing.shared_memory arrays, the
+workers attach to them by name, and each chunk writes its results straight
+into a shared output array at its own offsets. Results therefore come back in
+input order whatever order the chunks finish in.
+
+    with ParallelPricer(workers = 8) as pool:
+        prices = pool.nperiod_bopm(op_type, 100, strikes, 0.3, 0.05, 2000, 1, exercise = 'American')
+        greeks = pool.bsm_chain(op_type, spots, strikes, vols, rates, times)
+
+Inputs broadcast like BsmChain (scalars are shared by every contract). With
+workers = 1 the chunks run in the calling process, with no pool at all.'''
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from atop.blackscholes.bsmchain import BsmChain
+from atop.options.nperiodbopm import NPeriodBOPM
+
+BSM_OUTPUTS = ('price', 'delta', 'gamma', 'theta')
+
+
+class SharedArrays:
+    '''A set of named NumPy arrays, each backed by its own shared memory block.
+
+    spec is the picklable description workers use to attach: {name: (block name, shape, dtype)}.
+    The creating process owns the blocks and releases them with close().'''
+    def __init__(self, arrays):
+        self.blocks = {}
+        self.arrays = {}
+        self.spec = {}
+        try:
+            for name, values in arrays.items():
+                values = np.ascontiguousarray(values)
+                block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+                self.blocks[name] = block
+                array = np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)
+                array[...] = values
+                self.arrays[name] = array
+                self.spec[name] = (block.name, values.shape, values.dtype.str)
+        except BaseException:
+            self.close()
+            raise
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self.arrays = {}  # views must go before the buffers can be released
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+
+def attach_block(block_name):
+    '''Opens an existing shared memory block, leaving its lifetime to the creating process.'''
+    try:
+        return shared_memory.SharedMemory(name=block_name, track=False)  # Python 3.13+
+    except TypeError:
+        # older Pythons register the block again, with the resource tracker the pool
+        # workers share with their parent, which is harmless: the parent unlinks it.
+        return shared_memory.SharedMemory(name=block_name)
+
+
+# worker side: the blocks of the current job, attached once per worker process.
+_attached = {'spec': None, 'blocks': [], 'arrays': {}}
+
+
+def worker_arrays(spec):
+    if _attached['spec'] != spec:
+        _attached['arrays'] = {}
+        for block in _attached['blocks']:
+            block.close()
+        blocks, arrays = [], {}
+        for name, (block_name, shape, dtype) in spec.items():
+            block = attach_block(block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        _attached.update(spec=spec, blocks=blocks, arrays=arrays)
+    return _attached['arrays']
+
+
+def bsm_chunk(arrays, start, stop):
+    chunk = slice(start, stop)
+    chain = BsmChain(np.where(arrays['is_call'][chunk], 'Call', 'Put'), arrays['underlying'][chunk],
+                     arrays['strike'][chunk], arrays['volatility'][chunk],
+                     arrays['risk_free'][chunk], arrays['time_in_years'][chunk])
+    for name in BSM_OUTPUTS:
+        arrays[name][chunk] = getattr(chain, name)
+
+
+def lattice_chunk(arrays, start, stop, options):
+    is_call = arrays['is_call']
+    underlying, strike = arrays['underlying'], arrays['strike']
+    volatility, risk_free = arrays['volatility'], arrays['risk_free']
+    nperiods, time_in_years = arrays['nperiods'], arrays['time_in_years']
+    price = arrays['price']
+    for i in range(start, stop):
+        price[i] = NPeriodBOPM('Call' if is_call[i] else 'Put', float(underlying[i]), float(strike[i]),
+                               float(volatility[i]), float(risk_free[i]), int(nperiods[i]),
+                               float(time_in_years[i]), **options).price
+
+
+_CHUNK_PRICERS = {'bsm': bsm_chunk, 'lattice': lattice_chunk}
+
+
+def run_chunk(kind, spec, start, stop, *args):
+    '''Worker entry point: prices contracts start:stop of the shared batch.'''
+    _CHUNK_PRICERS[kind](worker_arrays(spec), start, stop, *args)
+    return start
+
+
+class ParallelPricer:
+    '''Prices batches of contracts on a process pool, see the module docstring.
+
+    workers defaults to the number of CPUs. chunks_per_worker sets how finely a
+    batch is cut: more chunks balance uneven contracts (deep lattices next to
+    shallow ones) at the cost of more task round trips. mp_context is passed to
+    ProcessPoolExecutor (e.g. multiprocessing.get_context('spawn')).'''
+    def __init__(self, workers = None, chunks_per_worker = 4, mp_context = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunks_per_worker = chunks_per_worker
+        self.mp_context = mp_context
+        self.executor = None
+
+    def __repr__(self):
+        return '\nParallel pricer on {} worker processes.'.format(self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def chunks(self, size, chunk_size = None):
+        if chunk_size is None:
+            chunk_size = -(-size // (self.workers * self.chunks_per_worker))
+        chunk_size = max(1, chunk_size)
+        return [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+
+    def map_chunks(self, kind, shared, size, chunk_size, *args):
+        chunks = self.chunks(size, chunk_size)
+        if self.workers == 1:
+            for start, stop in chunks:
+                _CHUNK_PRICERS[kind](shared.arrays, start, stop, *args)
+            return
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=self.mp_context)
+        futures = [self.executor.submit(run_chunk, kind, shared.spec, start, stop, *args)
+                   for start, stop in chunks]
+        for future in futures:
+            future.result()  # re-raises a worker's exception here
+
+    def contract_arrays(self, op_type, underlying, strike, volatility, risk_free, time_in_years, **extra):
+        columns = np.broadcast_arrays(np.asarray(op_type) == 'Call',
+                                      np.asarray(underlying, dtype=float),
+                                      np.asarray(strike, dtype=float),
+                                      np.asarray(volatility, dtype=float),
+                                      np.asarray(risk_free, dtype=float),
+                                      np.asarray(time_in_years, dtype=float),
+                                      *(np.asarray(value) for value in extra.values()))
+        names = ('is_call', 'underlying', 'strike', 'volatility', 'risk_free', 'time_in_years') + tuple(extra)
+        shape = columns[0].shape
+        return shape, {name: column.ravel() for name, column in zip(names, columns)}
+
+    def bsm_chain(self, op_type, underlying, strike, volatility, risk_free, time_in_years, chunk_size = None):
+        '''Black-Scholes-Merton price, delta, gamma and theta of every contract, as a dict of arrays.'''
+        shape, arrays = self.contract_arrays(op_type, underlying, strike, volatility, risk_free, time_in_years)
+        size = arrays['is_call'].size
+        for name in BSM_OUTPUTS:
+            arrays[name] = np.empty(size)
+        with SharedArrays(arrays) as shared:
+            self.map_chunks('bsm', shared, size, chunk_size)
+            return {name: shared[name].reshape(shape).copy() for name in BSM_OUTPUTS}
+
+    def nperiod_bopm(self, op_type, underlying, strike, volatility, risk_free, nperiods, time_in_years,
+                     chunk_size = None, **options):
+        '''NPeriodBOPM price of every contract, one lattice each. options (factor_method,
+        exercise, acceleration, ...) apply to the whole batch.'''
+        shape, arrays = self.contract_arrays(op_type, underlying, strike, volatility, risk_free, time_in_years,
+                                             nperiods=np.asarray(nperiods, dtype=np.int64))
+        size = arrays['is_call'].size
+        arrays['price'] = np.empty(size)
+        with SharedArrays(arrays) as shared:
+            self.map_chunks('lattice', shared, size, chunk_size, options)
+            return shared['price'].reshape(shape).copy()
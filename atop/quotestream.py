@@ -0,0 +1,228 @@
+'''Streaming pricer for option quote files.
+
+Reads CSV or JSON-lines quotes in fixed-size batches, prices every batch with
+the vectorized Black-Scholes-Merton engines and writes (or yields) the results
+batch by batch, so memory stays bounded by batch_size however long the file is.
+
+Each input row needs
+    op_type, underlying, strike, risk_free, time_in_years
+and at least one of
+    price      -- a quoted premium; its implied volatility is solved for
+    volatility -- a model volatility to price at
+Rows with a quote but no volatility are priced (and their greeks taken) at the
+implied volatility. Input fields can be renamed with `columns`, e.g.
+{'underlying': 'spot', 'price': 'mid'}.
+
+Every result batch is a dict of equal-length arrays: the input fields followed
+by implied_vol, converged, model_price, delta, gamma and theta (nan where a
+field does not apply or no implied volatility exists). converged is True where
+the implied volatility solver met its tolerance, False for unquoted rows and
+for quotes it could not solve.
+
+Generator use:
+    for batch in price_file('quotes.csv', batch_size = 100_000):
+        ...
+
+Command line:
+    python -m atop.quotestream quotes.csv priced.csv --batch-size 100000'''
+
+import argparse
+import csv
+from itertools import islice
+import json
+import sys
+
+import numpy as np
+
+from atop.blackscholes.bsmchain import BsmChain
+from atop.blackscholes.impliedvol import ImpliedVolChain
+from atop.util.colstore import ColumnWriter
+
+INPUT_FIELDS = ('op_type', 'underlying', 'strike', 'volatility', 'risk_free', 'time_in_years', 'price')
+OUTPUT_FIELDS = INPUT_FIELDS + ('implied_vol', 'converged', 'model_price', 'delta', 'gamma', 'theta')
+REQUIRED_FIELDS = ('op_type', 'underlying', 'strike', 'risk_free', 'time_in_years')
+# fixed widths for the column store, whatever the first batch holds ('Put' alone would give U3).
+COLUMN_DTYPES = {'op_type': 'U4'}
+
+_OP_TYPES = {'call': 'Call', 'c': 'Call', 'put': 'Put', 'p': 'Put'}
+
+
+def detect_format(path):
+    '''"jsonl" for .jsonl / .ndjson / .json files, "csv" otherwise.'''
+    return 'jsonl' if str(path).lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(handle, file_format):
+    '''Yields one dict per quote, lazily.'''
+    if file_format == 'csv':
+        yield from csv.DictReader(handle)
+    elif file_format == 'jsonl':
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError('Unknown quote file format {!r}, expected "csv" or "jsonl".'.format(file_format))
+
+
+def float_column(values):
+    '''Float array from text or numbers; blanks and None become nan.'''
+    try:
+        return np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        return np.array([float('nan') if value in ('', None) else float(value) for value in values])
+
+
+def op_type_column(values):
+    try:
+        return np.array([_OP_TYPES[str(value).strip().lower()] for value in values])
+    except KeyError as error:
+        raise ValueError('Unknown op_type {!r}, expected Call or Put.'.format(error.args[0])) from None
+
+
+def read_batches(handle, batch_size = 50_000, file_format = 'csv', columns = None):
+    '''Yields dicts of column arrays, at most batch_size quotes each.
+
+    Fields absent from the file (volatility or price) come back as nan columns;
+    in JSON lines a field may also be left out of single rows, which are nan.'''
+    rename = dict(columns or {})
+    rows = read_rows(handle, file_format)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            return
+        batch = {}
+        for field in INPUT_FIELDS:
+            key = rename.get(field, field)
+            if not any(key in row for row in chunk):
+                if field in REQUIRED_FIELDS:
+                    raise ValueError('Quote file has no {!r} column.'.format(key))
+                batch[field] = np.full(len(chunk), np.nan)
+                continue
+            values = [row.get(key) for row in chunk]
+            batch[field] = op_type_column(values) if field == 'op_type' else float_column(values)
+        yield batch
+
+
+def price_batch(batch, tolerance = 1e-8):
+    '''Prices one batch of quotes. Returns a new dict with the output columns.'''
+    size = batch['op_type'].size
+    result = dict(batch)
+    implied_vol = np.full(size, np.nan)
+    converged = np.zeros(size, dtype=bool)
+
+    quoted = ~np.isnan(batch['price'])
+    if quoted.any():
+        solved = ImpliedVolChain(batch['op_type'][quoted], batch['price'][quoted], batch['underlying'][quoted],
+                                 batch['strike'][quoted], batch['risk_free'][quoted],
+                                 batch['time_in_years'][quoted], tolerance = tolerance)
+        implied_vol[quoted] = solved.volatility
+        converged[quoted] = solved.converged
+    result['implied_vol'] = implied_vol
+    result['converged'] = converged
+
+    volatility = np.where(np.isnan(batch['volatility']), implied_vol, batch['volatility'])
+    for field in ('model_price', 'delta', 'gamma', 'theta'):
+        result[field] = np.full(size, np.nan)
+    priceable = ~np.isnan(volatility)
+    if priceable.any():
+        with np.errstate(divide='ignore', invalid='ignore'):
+            chain = BsmChain(batch['op_type'][priceable], batch['underlying'][priceable],
+                             batch['strike'][priceable], volatility[priceable],
+                             batch['risk_free'][priceable], batch['time_in_years'][priceable])
+        result['model_price'][priceable] = chain.price
+        result['delta'][priceable] = chain.delta
+        result['gamma'][priceable] = chain.gamma
+        result['theta'][priceable] = chain.theta
+    return result
+
+
+def price_stream(handle, batch_size = 50_000, file_format = 'csv', columns = None, tolerance = 1e-8):
+    '''Generator of priced batches from an open quote file.'''
+    for batch in read_batches(handle, batch_size, file_format, columns):
+        yield price_batch(batch, tolerance)
+
+
+def price_file(path, batch_size = 50_000, file_format = None, columns = None, tolerance = 1e-8):
+    '''Generator of priced batches from a quote file path. The file stays open while iterating.'''
+    with open(path, newline='') as handle:
+        yield from price_stream(handle, batch_size, file_format or detect_format(path), columns, tolerance)
+
+
+class ResultWriter:
+    '''Writes priced batches to an open text file as CSV or JSON lines, one batch at a time.'''
+    def __init__(self, handle, file_format = 'csv', fields = OUTPUT_FIELDS):
+        self.handle = handle
+        self.file_format = file_format
+        self.fields = fields
+        self.rows_written = 0
+        if file_format == 'csv':
+            self.writer = csv.writer(handle)
+            self.writer.writerow(fields)
+        elif file_format != 'jsonl':
+            raise ValueError('Unknown output format {!r}, expected "csv" or "jsonl".'.format(file_format))
+
+    def write(self, result):
+        # tolist() turns the columns into Python scalars in one pass per column.
+        columns = [result[field].tolist() for field in self.fields]
+        if self.file_format == 'csv':
+            self.writer.writerows(zip(*columns))
+        else:
+            write = self.handle.write
+            for row in zip(*columns):
+                # nan is not valid JSON, missing values are written as null.
+                write(json.dumps({field: None if value != value else value
+                                  for field, value in zip(self.fields, row)}) + '\n')
+        self.rows_written += len(columns[0])
+
+
+def price_to_file(source, target, batch_size = 50_000, input_format = None, output_format = None,
+                  columns = None, tolerance = 1e-8):
+    '''Prices the quote file source into target ("-" is stdin / stdout). Returns the number of rows.
+
+    output_format = 'columns' writes target as a memory-mappable column store
+    directory (see atop.util.colstore) instead of a text file.'''
+    input_format = input_format or ('csv' if source == '-' else detect_format(source))
+    output_format = output_format or ('csv' if target == '-' else detect_format(target))
+    source_handle = sys.stdin if source == '-' else open(source, newline='')
+    try:
+        if output_format == 'columns':
+            with ColumnWriter(target, metadata={'source': source}, dtypes=COLUMN_DTYPES) as writer:
+                for result in price_stream(source_handle, batch_size, input_format, columns, tolerance):
+                    writer.write({field: result[field] for field in OUTPUT_FIELDS})
+            return writer.rows
+        target_handle = sys.stdout if target == '-' else open(target, 'w', newline='')
+        try:
+            writer = ResultWriter(target_handle, output_format)
+            for result in price_stream(source_handle, batch_size, input_format, columns, tolerance):
+                writer.write(result)
+            return writer.rows_written
+        finally:
+            if target_handle is not sys.stdout:
+                target_handle.close()
+    finally:
+        if source_handle is not sys.stdin:
+            source_handle.close()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help='quote file (CSV or JSON lines), - for stdin')
+    parser.add_argument('target', help='output file (CSV or JSON lines) or column store directory, - for stdout')
+    parser.add_argument('--batch-size', type=int, default=50_000, help='quotes priced per batch')
+    parser.add_argument('--input-format', choices=('csv', 'jsonl'), help='default: from the file extension')
+    parser.add_argument('--output-format', choices=('csv', 'jsonl', 'columns'),
+                        help='default: from the file extension')
+    parser.add_argument('--column', action='append', default=[], metavar='FIELD=NAME',
+                        help='read FIELD from the input column NAME, e.g. underlying=spot')
+    parser.add_argument('--tolerance', type=float, default=1e-8, help='implied volatility price tolerance')
+    args = parser.parse_args(argv)
+
+    columns = dict(pair.split('=', 1) for pair in args.column)
+    rows = price_to_file(args.source, args.target, args.batch_size, args.input_format,
+                         args.output_format, columns, args.tolerance)
+    print('Priced {} quotes.'.format(rows), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
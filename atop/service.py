@@ -0,0 +1,336 @@
+'''Local HTTP/JSON pricing service with request micro-batching.
+
+Single-contract requests arriving at the same time are queued and priced
+together: the batcher waits for the first request, then collects more until
+it has max_batch of them or max_wait seconds have passed, and prices the
+whole batch with one BsmChain call. Each request waits at most max_wait for
+company, in exchange for one vectorized evaluation instead of one BsmNode per
+request.
+
+Backpressure: at most max_pending requests may be queued. Beyond that new
+requests are refused straight away with 503 (and a Retry-After header) rather
+than queueing without bound and timing everybody out. A single list of more
+than max_pending contracts could never be queued, so it gets 413 instead.
+
+Endpoints:
+    POST /price  -- one contract {"op_type": "Call", "underlying": 100, "strike": 110,
+                    "volatility": 0.3, "risk_free": 0.05, "time_in_years": 1}
+                    or a list of them. Answers price, delta, gamma and theta.
+    GET /stats   -- request and batch counts, mean batch size, p50 / p99 latency
+    GET /health
+
+Run:
+    python -m atop.service --port 8471 --max-batch 256 --max-wait-ms 2'''
+
+import argparse
+import asyncio
+from collections import deque
+import json
+import math
+import time
+
+import numpy as np
+
+from atop.blackscholes.bsmchain import BsmChain
+
+CONTRACT_FIELDS = ('op_type', 'underlying', 'strike', 'volatility', 'risk_free', 'time_in_years')
+RESULT_FIELDS = ('price', 'delta', 'gamma', 'theta')
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class ServiceBusy(Exception):
+    '''Raised when the request queue is full.'''
+
+
+class BatchTooLarge(Exception):
+    '''Raised when one request holds more contracts than the queue can ever take.'''
+
+
+class InvalidContract(ValueError):
+    pass
+
+
+def parse_contract(payload):
+    '''Validates one JSON contract, returning a tuple in CONTRACT_FIELDS order.'''
+    if not isinstance(payload, dict):
+        raise InvalidContract('A contract must be a JSON object.')
+    missing = [field for field in CONTRACT_FIELDS if field not in payload]
+    if missing:
+        raise InvalidContract('Missing field(s): {}.'.format(', '.join(missing)))
+    if payload['op_type'] not in ('Call', 'Put'):
+        raise InvalidContract('op_type must be "Call" or "Put".')
+    try:
+        numbers = tuple(float(payload[field]) for field in CONTRACT_FIELDS[1:])
+    except (TypeError, ValueError):
+        raise InvalidContract('underlying, strike, volatility, risk_free and time_in_years must be numbers.') from None
+    if not all(math.isfinite(number) for number in numbers):
+        raise InvalidContract('underlying, strike, volatility, risk_free and time_in_years must be finite.')
+    underlying, strike, volatility, risk_free, time_in_years = numbers
+    if underlying <= 0 or strike <= 0 or volatility <= 0 or time_in_years <= 0:
+        raise InvalidContract('underlying, strike, volatility and time_in_years must be positive.')
+    return (payload['op_type'],) + numbers
+
+
+def price_contracts(contracts):
+    '''Prices a list of parsed contracts with one BsmChain. Returns one result dict per contract.'''
+    chain = BsmChain(*(np.array(column) for column in zip(*contracts)))
+    columns = [getattr(chain, field).tolist() for field in RESULT_FIELDS]
+    return [dict(zip(RESULT_FIELDS, row)) for row in zip(*columns)]
+
+
+class LatencyStats:
+    '''Request latencies (the last `window` of them) and batch counters.'''
+    def __init__(self, window = 100_000):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.largest_batch = 0
+        self.rejected = 0
+        self.started = time.monotonic()
+
+    def record_batch(self, size):
+        self.batches += 1
+        self.batched_requests += size
+        self.largest_batch = max(self.largest_batch, size)
+
+    def record_latency(self, seconds):
+        self.requests += 1
+        self.latencies.append(seconds)
+
+    def percentile(self, q):
+        if not self.latencies:
+            return None
+        return float(np.percentile(np.fromiter(self.latencies, float, len(self.latencies)), q))
+
+    def summary(self):
+        p50, p99 = self.percentile(50), self.percentile(99)
+        elapsed = time.monotonic() - self.started
+        return {'requests': self.requests, 'rejected': self.rejected, 'batches': self.batches,
+                'mean_batch': self.batched_requests / self.batches if self.batches else 0.0,
+                'largest_batch': self.largest_batch,
+                'requests_per_second': self.requests / elapsed if elapsed > 0 else 0.0,
+                'p50_ms': None if p50 is None else 1e3 * p50,
+                'p99_ms': None if p99 is None else 1e3 * p99}
+
+
+class MicroBatcher:
+    '''Collects submitted contracts into batches for price_batch (list of contracts -> list of results).'''
+    def __init__(self, price_batch = price_contracts, max_batch = 256, max_wait = 0.002,
+                 max_pending = 10_000, stats = None):
+        self.price_batch = price_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.stats = stats or LatencyStats()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.arrived = asyncio.Event()  # set whenever a contract is queued
+        self.worker = None
+
+    def start(self):
+        if self.worker is None:
+            self.worker = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+
+    async def submit(self, contract):
+        '''Queues one contract and waits for its result. Raises ServiceBusy when the queue is full.'''
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((contract, future))
+        except asyncio.QueueFull:
+            self.stats.rejected += 1
+            raise ServiceBusy() from None
+        self.arrived.set()
+        return await future
+
+    async def submit_many(self, contracts):
+        '''Queues several contracts, all or none, and waits for their results in order.'''
+        if self.queue.maxsize and len(contracts) > self.queue.maxsize:
+            self.stats.rejected += 1
+            raise BatchTooLarge()
+        if self.queue.maxsize and self.queue.maxsize - self.queue.qsize() < len(contracts):
+            self.stats.rejected += 1
+            raise ServiceBusy()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for contract in contracts:
+            future = loop.create_future()
+            self.queue.put_nowait((contract, future))
+            futures.append(future)
+        self.arrived.set()
+        return await asyncio.gather(*futures)
+
+    async def next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.max_batch or remaining <= 0:
+                return batch
+            # wait on an event rather than wait_for(queue.get()): a get cancelled
+            # by the timeout can otherwise swallow an item on older Pythons.
+            self.arrived.clear()
+            try:
+                await asyncio.wait_for(self.arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        while True:
+            batch = await self.next_batch()
+            # requests whose client went away are dropped before pricing.
+            batch = [(contract, future) for contract, future in batch if not future.done()]
+            if not batch:
+                continue
+            self.stats.record_batch(len(batch))
+            try:
+                results = self.price_batch([contract for contract, future in batch])
+            except Exception as error:
+                for contract, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for (contract, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class PricingServer:
+    '''asyncio HTTP/1.1 front end of a MicroBatcher (keep-alive, JSON bodies).'''
+    def __init__(self, host = '127.0.0.1', port = 8471, max_batch = 256, max_wait = 0.002,
+                 max_pending = 10_000, max_body = 1 << 20):
+        self.host = host
+        self.port = port
+        self.max_body = max_body
+        self.batcher = MicroBatcher(max_batch=max_batch, max_wait=max_wait, max_pending=max_pending)
+        self.stats = self.batcher.stats
+        self.server = None
+
+    async def start(self):
+        self.batcher.start()
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]  # the real port when 0 was asked for
+        return self
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        await self.batcher.stop()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                method, path, version = (lines[0].split(' ') + ['', '', ''])[:3]
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, _, content = line.partition(':')
+                        headers[name.strip().lower()] = content.strip()
+                length = headers.get('content-length') or '0'
+                if not (length.isascii() and length.isdigit()):
+                    # without a usable length the body can't be found, so the connection is closed.
+                    await self.respond(writer, 400, {'error': 'Content-Length must be a non-negative integer.'},
+                                       keep_alive=False)
+                    break
+                length = int(length)
+                if length > self.max_body:
+                    await self.respond(writer, 413, {'error': 'Request body too large.'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status, payload, extra = await self.dispatch(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                await self.respond(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, path, body):
+        '''Returns (status, JSON payload, extra headers).'''
+        if path == '/price':
+            if method != 'POST':
+                return 405, {'error': 'Use POST.'}, {}
+            return await self.price(body)
+        if path == '/stats' and method == 'GET':
+            return 200, self.stats.summary(), {}
+        if path == '/health' and method == 'GET':
+            return 200, {'status': 'ok', 'pending': self.batcher.queue.qsize()}, {}
+        return 404, {'error': 'Unknown endpoint {}.'.format(path)}, {}
+
+    async def price(self, body):
+        start = time.perf_counter()
+        try:
+            payload = json.loads(body)
+            single = not isinstance(payload, list)
+            contracts = [parse_contract(item) for item in ([payload] if single else payload)]
+        except (ValueError, InvalidContract) as error:
+            return 400, {'error': str(error)}, {}
+        try:
+            results = await self.batcher.submit_many(contracts)
+        except BatchTooLarge:
+            return 413, {'error': 'At most {} contracts per request.'.format(self.batcher.queue.maxsize)}, {}
+        except ServiceBusy:
+            return 503, {'error': 'Too many pending requests, retry shortly.'}, {'Retry-After': '1'}
+        except Exception as error:
+            return 500, {'error': str(error)}, {}
+        self.stats.record_latency(time.perf_counter() - start)
+        return 200, results[0] if single else results, {}
+
+    async def respond(self, writer, status, payload, keep_alive = True, extra = None):
+        body = json.dumps(payload).encode()
+        head = ['HTTP/1.1 {} {}'.format(status, _REASONS.get(status, '')),
+                'Content-Type: application/json',
+                'Content-Length: {}'.format(len(body)),
+                'Connection: {}'.format('keep-alive' if keep_alive else 'close')]
+        head += ['{}: {}'.format(name, value) for name, value in (extra or {}).items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8471)
+    parser.add_argument('--max-batch', type=int, default=256, help='most requests priced together')
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help='longest a request waits for a batch')
+    parser.add_argument('--max-pending', type=int, default=10_000, help='queued requests before refusing with 503')
+    args = parser.parse_args(argv)
+
+    server = PricingServer(args.host, args.port, args.max_batch, args.max_wait_ms / 1e3, args.max_pending)
+    print('Pricing service on http://{}:{}'.format(args.host, args.port))
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,92 @@
+from atop.blackscholes.bsmchain import bsm_chain_price
+import numpy as np
+
+
+class ScenarioGrid:
+    '''Scenario / stress-grid revaluation of an OptionPortfolio.
+
+    The grid is every combination of
+        spot_shocks -- relative moves of the underlying (0.05 is +5%),
+                       or absolute moves when relative_spot = False
+        vol_shocks  -- absolute volatility shifts (0.02 is +2 vol points)
+        rate_shifts -- absolute risk-free rate shifts
+        time_decay  -- years to roll forward (contracts left with no time are
+                       worth their intrinsic value)
+    and each scenario's shocks are stored as flat arrays of length nscenarios.
+
+    Revaluation broadcasts the (scenarios x 1) shocks against the (1 x positions)
+    book and prices the whole block with one Black-Scholes-Merton call. Blocks are
+    cut into chunks of scenarios, and of positions when a single scenario of the
+    book is already larger than max_cells, so no intermediate array holds more
+    than max_cells values, keeping memory bounded for large books.'''
+    def __init__(self, spot_shocks = (0.0,), vol_shocks = (0.0,), rate_shifts = (0.0,), time_decay = (0.0,),
+                 relative_spot = True, max_cells = 2_000_000):
+        grid = np.meshgrid(np.asarray(spot_shocks, dtype=float),
+                           np.asarray(vol_shocks, dtype=float),
+                           np.asarray(rate_shifts, dtype=float),
+                           np.asarray(time_decay, dtype=float),
+                           indexing='ij')
+        self.spot_shocks, self.vol_shocks, self.rate_shifts, self.time_decay = (axis.ravel() for axis in grid)
+        self.grid_shape = grid[0].shape
+        self.nscenarios = self.spot_shocks.size
+        self.relative_spot = relative_spot
+        self.max_cells = max_cells
+
+    def __repr__(self):
+        return '\nScenario grid of {} scenarios (spot x vol x rate x time = {}).'.format(
+            self.nscenarios, ' x '.join(str(n) for n in self.grid_shape))
+
+    def __len__(self):
+        return self.nscenarios
+
+    def revalue(self, book, scenarios):
+        '''Position values (not P&L) for a slice of scenarios, shape (scenarios x positions).'''
+        spot = self.spot_shocks[scenarios, np.newaxis]
+        if self.relative_spot:
+            underlying = book['underlying'] * (1 + spot)
+        else:
+            underlying = book['underlying'] + spot
+        volatility = np.maximum(book['volatility'] + self.vol_shocks[scenarios, np.newaxis], 1e-8)
+        risk_free = book['risk_free'] + self.rate_shifts[scenarios, np.newaxis]
+        remaining = book['time_in_years'] - self.time_decay[scenarios, np.newaxis]
+
+        is_call = book['op_type'] == 'Call'
+        expired = remaining <= 0
+        values = bsm_chain_price(is_call, underlying, book['strike'], volatility, risk_free,
+                                 np.maximum(remaining, 1e-12), book['dividend_yield'])
+        if expired.any():
+            intrinsic = np.maximum(np.where(is_call, 1.0, -1.0) * (underlying - book['strike']), 0.0)
+            values = np.where(expired, intrinsic, values)
+        return values
+
+    def pnl_chunks(self, portfolio):
+        '''Yields (scenario slice, position slice, P&L block) triples, P&L sized by signed position.
+
+        Lets callers reduce the cube chunk by chunk without ever holding all of it.'''
+        book = portfolio.to_arrays()
+        npositions = book['size'].size
+        base = bsm_chain_price(book['op_type'] == 'Call', book['underlying'], book['strike'],
+                               book['volatility'], book['risk_free'], book['time_in_years'],
+                               book['dividend_yield'])
+        position_chunk = max(1, min(npositions, self.max_cells))
+        scenario_chunk = max(1, self.max_cells // position_chunk)
+        for first in range(0, npositions, position_chunk):
+            positions = slice(first, min(first + position_chunk, npositions))
+            part = {name: column[positions] for name, column in book.items()}
+            for start in range(0, self.nscenarios, scenario_chunk):
+                scenarios = slice(start, min(start + scenario_chunk, self.nscenarios))
+                yield scenarios, positions, (self.revalue(part, scenarios) - base[positions]) * part['size']
+
+    def pnl_cube(self, portfolio):
+        '''Full P&L cube, shape (scenarios x positions).'''
+        cube = np.empty((self.nscenarios, len(portfolio)))
+        for scenarios, positions, pnl in self.pnl_chunks(portfolio):
+            cube[scenarios, positions] = pnl
+        return cube
+
+    def scenario_pnl(self, portfolio):
+        '''Total book P&L per scenario, without materialising the cube.'''
+        totals = np.zeros(self.nscenarios)
+        for scenarios, positions, pnl in self.pnl_chunks(portfolio):
+            totals[scenarios] += pnl.sum(axis=1)
+        return totals
@@ -0,0 +1,301 @@
+'''Columnar on-disk store for pricing results and lattice state.
+
+A store is a directory holding one .npy file per column plus schema.json,
+a header recording the store kind, every column's dtype and shape, and free
+form metadata (model parameters and the like):
+
+    results/
+        schema.json
+        price.npy
+        delta.npy
+        ...
+
+Columns are plain NumPy arrays with fixed-width dtypes ('Call'/'Put' are
+stored as short unicode, never pickled objects), so ColumnStore opens them
+with np.load(mmap_mode = 'r'): nothing is read until it is used and every
+process opening the same store shares the pages through the OS cache.
+(.npz archives are zip files and can't be memory mapped, hence a directory.)
+
+schema.json is written last, so a reader never sees a half written store.
+
+    write_columns('results', {'price': chain.price, 'delta': chain.delta})
+    store = ColumnStore('results')
+    store['price'][:10]'''
+
+import json
+import os
+
+import numpy as np
+
+from atop.blackscholes.bsmchain import BsmChain
+
+SCHEMA_FILE = 'schema.json'
+FORMAT_NAME = 'atop-columns'
+FORMAT_VERSION = 1
+
+
+def column_array(values):
+    '''values as an array that can be stored and memory mapped (no object dtype).'''
+    array = np.asarray(values)
+    if array.dtype == object:
+        # text held as objects (lists of str) becomes fixed-width unicode.
+        array = array.astype(str)
+    return array
+
+
+def jsonable(value):
+    '''Converts NumPy scalars and arrays inside metadata to plain Python for json.'''
+    if isinstance(value, dict):
+        return {str(key): jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [jsonable(item) for item in value]
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return value
+
+
+def column_path(path, name):
+    return os.path.join(path, name + '.npy')
+
+
+def write_schema(path, kind, columns, metadata):
+    schema = {'format': FORMAT_NAME, 'version': FORMAT_VERSION, 'kind': kind,
+              'columns': {name: {'dtype': np.lib.format.dtype_to_descr(dtype), 'shape': list(shape)}
+                          for name, (dtype, shape) in columns.items()},
+              'metadata': jsonable(metadata or {})}
+    with open(os.path.join(path, SCHEMA_FILE), 'w') as handle:
+        json.dump(schema, handle, indent=2)
+
+
+def write_columns(path, columns, kind = 'table', metadata = None):
+    '''Writes a dict of name -> array as a store in directory path (created if needed).
+
+    kind = 'table' requires every column to have the same length (rows);
+    any other kind (e.g. 'lattice') stores columns of unrelated shapes.'''
+    arrays = {name: column_array(values) for name, values in columns.items()}
+    if kind == 'table':
+        lengths = {len(array) for array in arrays.values()}
+        if len(lengths) > 1:
+            raise ValueError('Table columns must all have the same length, got {}.'.format(sorted(lengths)))
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(column_path(path, name), array, allow_pickle=False)
+    write_schema(path, kind, {name: (array.dtype, array.shape) for name, array in arrays.items()}, metadata)
+
+
+class ColumnWriter:
+    '''Appends batches of rows to a table store, for results produced batch by batch.
+
+    The column files are streamed to disk as batches arrive; close() fixes the
+    row count into each .npy header (NumPy leaves room to grow it in place)
+    and writes schema.json. Leaving a with block on an exception closes the
+    files without a schema, so the partial store can't be opened.
+
+    Dtypes are taken from the first batch unless given in dtypes ({name: dtype}).
+    A text column that meets a longer string later is widened, which rewrites
+    its file once; fixing the width up front avoids that.'''
+    def __init__(self, path, metadata = None, dtypes = None):
+        self.path = path
+        self.metadata = metadata
+        self.fixed_dtypes = {name: np.dtype(dtype) for name, dtype in (dtypes or {}).items()}
+        self.rows = 0
+        self.handles = {}
+        self.dtypes = {}
+        self.row_shapes = {}
+        self.header_sizes = {}
+        os.makedirs(path, exist_ok=True)
+        schema_path = os.path.join(path, SCHEMA_FILE)
+        if os.path.exists(schema_path):
+            os.remove(schema_path)  # stale until close() writes the new one
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def header(self, name, rows):
+        return {'descr': np.lib.format.dtype_to_descr(self.dtypes[name]), 'fortran_order': False,
+                'shape': (rows,) + self.row_shapes[name]}
+
+    def open_columns(self, batch):
+        for name, values in batch.items():
+            array = column_array(values)
+            self.dtypes[name] = self.fixed_dtypes.get(name, array.dtype)
+            self.row_shapes[name] = array.shape[1:]
+            self.open_column(name)
+
+    def open_column(self, name):
+        handle = open(column_path(self.path, name), 'wb')
+        np.lib.format.write_array_header_1_0(handle, self.header(name, 0))
+        self.header_sizes[name] = handle.tell()
+        self.handles[name] = handle
+
+    def widen(self, name, dtype):
+        '''Rewrites a text column's rows so far with a wider dtype.'''
+        self.handles[name].close()
+        with open(column_path(self.path, name), 'rb') as handle:
+            handle.seek(self.header_sizes[name])
+            written = np.fromfile(handle, dtype=self.dtypes[name])
+        self.dtypes[name] = dtype
+        self.open_column(name)
+        self.handles[name].write(written.astype(dtype).tobytes())
+
+    def write(self, batch):
+        '''Appends one batch, a dict of name -> array with the same columns every time.'''
+        if not self.handles:
+            self.open_columns(batch)
+        if batch.keys() != self.handles.keys():
+            raise ValueError('Batch columns {} do not match the store columns {}.'.format(
+                sorted(batch), sorted(self.handles)))
+        lengths = set()
+        for name, values in batch.items():
+            array = column_array(values)
+            dtype = self.dtypes[name]
+            if array.dtype != dtype:
+                if dtype.kind in 'US' and array.dtype.kind == dtype.kind and array.dtype.itemsize > dtype.itemsize:
+                    self.widen(name, array.dtype)
+                elif not np.can_cast(array.dtype, dtype, casting='same_kind'):
+                    raise ValueError('Column {!r} changed dtype from {} to {}.'.format(name, dtype, array.dtype))
+                else:
+                    array = array.astype(dtype)
+            lengths.add(len(array))
+            self.handles[name].write(np.ascontiguousarray(array).tobytes())
+        if len(lengths) > 1:
+            raise ValueError('Batch columns must all have the same length, got {}.'.format(sorted(lengths)))
+        self.rows += lengths.pop()
+
+    def close(self):
+        if self.handles is None:
+            return
+        for name, handle in self.handles.items():
+            handle.seek(0)
+            np.lib.format.write_array_header_1_0(handle, self.header(name, self.rows))
+            if handle.tell() != self.header_sizes[name]:
+                raise RuntimeError('Header of column {!r} outgrew its reserved space.'.format(name))
+            handle.close()
+        write_schema(self.path, 'table',
+                     {name: (self.dtypes[name], (self.rows,) + self.row_shapes[name]) for name in self.handles},
+                     self.metadata)
+        self.handles = None
+
+    def abort(self):
+        '''Closes the column files without writing schema.json.'''
+        if self.handles is None:
+            return
+        for handle in self.handles.values():
+            handle.close()
+        self.handles = None
+
+
+class ColumnStore:
+    '''Read side of a store: columns are opened lazily, memory mapped read-only.
+
+    mmap = False loads columns fully into memory instead (e.g. to modify them).'''
+    def __init__(self, path, mmap = True):
+        self.path = path
+        self.mmap_mode = 'r' if mmap else None
+        with open(os.path.join(path, SCHEMA_FILE)) as handle:
+            self.schema = json.load(handle)
+        if self.schema.get('format') != FORMAT_NAME:
+            raise ValueError('{} is not an atop column store.'.format(path))
+        if self.schema['version'] > FORMAT_VERSION:
+            raise ValueError('Column store version {} is newer than this reader ({}).'.format(
+                self.schema['version'], FORMAT_VERSION))
+        self.kind = self.schema['kind']
+        self.metadata = self.schema['metadata']
+        self.opened = {}
+
+    def __repr__(self):
+        return '\n{} column store at {}: {}.'.format(self.kind.capitalize(), self.path, ', '.join(self.keys()))
+
+    def __getitem__(self, name):
+        array = self.opened.get(name)
+        if array is None:
+            if name not in self.schema['columns']:
+                raise KeyError(name)
+            array = np.load(column_path(self.path, name), mmap_mode=self.mmap_mode, allow_pickle=False)
+            self.opened[name] = array
+        return array
+
+    def __contains__(self, name):
+        return name in self.schema['columns']
+
+    def __iter__(self):
+        return iter(self.schema['columns'])
+
+    def __len__(self):
+        '''Number of rows for a table, number of columns otherwise.'''
+        if self.kind == 'table':
+            shapes = [column['shape'] for column in self.schema['columns'].values()]
+            return shapes[0][0] if shapes else 0
+        return len(self.schema['columns'])
+
+    def keys(self):
+        return list(self.schema['columns'])
+
+    def to_dict(self):
+        return {name: self[name] for name in self}
+
+
+# savers for the pricing objects
+CHAIN_INPUTS = ('op_type', 'underlying', 'strike', 'volatility', 'risk_free', 'time_in_years', 'dividend_yield')
+CHAIN_COLUMNS = CHAIN_INPUTS + ('price', 'delta', 'gamma', 'theta')
+
+
+def save_chain(path, chain, metadata = None):
+    '''Stores a BsmChain's inputs, prices and greeks as a table.'''
+    write_columns(path, {name: np.ravel(getattr(chain, name)) for name in CHAIN_COLUMNS}, 'table', metadata)
+
+
+def load_chain(path):
+    '''Rebuilds the BsmChain stored by save_chain from its inputs.
+
+    Stores written before dividend_yield was a column price with no dividend.'''
+    store = ColumnStore(path, mmap=False)
+    inputs = {name: store[name] for name in CHAIN_INPUTS if name in store}
+    inputs.setdefault('dividend_yield', 0.0)
+    return BsmChain(**inputs)
+
+
+LATTICE_PARAMETERS = ('underlying', 'volatility', 'risk_free', 'nperiods', 'time_in_years', 'factor_method',
+                      'trade_position', 'exercise', 'acceleration', 'upfactor', 'downfactor',
+                      'up_neutral', 'down_neutral')
+
+
+def save_lattice(path, model, metadata = None):
+    '''Stores an NPeriodBOPM's lattice state: the terminal underlying and payoff
+    vectors, the price vector, the early-exercise boundary when one was found,
+    and the contract(s), with the model parameters in the metadata.'''
+    # the rollback reuses payoff_vector as its working buffer, so the terminal payoff is rebuilt.
+    terminal = model.underlying_vector[:, np.newaxis] if model.chain else model.underlying_vector
+    columns = {'op_type': np.atleast_1d(model.op_type),
+               'strike': np.atleast_1d(np.asarray(model.strike, dtype=float)),
+               'price': np.atleast_1d(model.price),
+               'underlying_vector': model.underlying_vector,
+               'payoff_vector': np.maximum(model.sign * (terminal - model.strike), 0.0),
+               'price_vector': model.price_vector}
+    if model.exercise_boundary is not None:
+        columns['exercise_boundary'] = model.exercise_boundary
+    parameters = {name: getattr(model, name) for name in LATTICE_PARAMETERS}
+    if model.trinomial:
+        parameters['middle_neutral'] = model.middle_neutral
+    parameters['model'] = 'NPeriodBOPM'
+    parameters.update(metadata or {})
+    write_columns(path, columns, 'lattice', parameters)
+
+
+def save_tree(path, tree, metadata = None):
+    '''Stores a BinTree's flat node buffers (underlying, option value and hedge ratio per node).'''
+    columns = {'underlying_values': tree.underlying_values,
+               'option_values': tree.option_values,
+               'hedge_ratios': tree.hedge_ratios}
+    parameters = {'model': 'BinTree', 'underlying': tree.underlying, 'upfactor': tree.upfactor,
+                  'downfactor': tree.downfactor, 'nperiods': tree.nperiods, 'op_type': tree.op_type,
+                  'strike': tree.strike, 'exercise': tree.exercise}
+    parameters.update(metadata or {})
+    write_columns(path, columns, 'table', parameters)
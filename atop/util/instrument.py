@@ -0,0 +1,239 @@
+'''Optional hot-path instrumentation for the pricers.
+
+The pricers report three kinds of measurements, each tagged with the pricer's
+name:
+    time  -- seconds spent in a calculation phase (d1/d2, cdf, lattice, ...)
+    count -- how many times something happened (nodes built, contracts priced)
+    value -- a size worth tracking (lattice nodes, contracts per lattice)
+
+Measurements go to the active sink, set with set_sink(). Any object with
+record_time, record_count and record_value methods will do; MemorySink
+aggregates in memory and JsonLinesSink writes one JSON object per
+measurement.
+
+Phase times are exclusive: when one timed phase triggers another (a lazy
+price pulling in d1 and the cdf), the inner phase's time is taken out of the
+outer one, so phases add up to the total instead of double counting. The
+phase stack is module-global, record from one thread at a time.
+
+With no sink set (the default) the pricers only pay for one module attribute
+check per phase, so the hooks can stay compiled in:
+
+    from atop.util import instrument
+    sink = instrument.MemorySink()
+    with instrument.recording(sink):
+        NPeriodBOPM('Put', 100, 110, 0.3, 0.05, 1000, 1, exercise = 'American')
+    sink.report()'''
+
+from contextlib import contextmanager
+import json
+import time
+
+# the active sink, None when instrumentation is off. Pricers check it directly.
+sink = None
+
+# time spent in nested phases, one running total per open phase (the bottom entry is a spare).
+_child_time = [0.0]
+
+
+def set_sink(new_sink):
+    '''Routes measurements to new_sink (None switches instrumentation off). Returns the old sink.'''
+    global sink
+    old, sink = sink, new_sink
+    return old
+
+
+def get_sink():
+    return sink
+
+
+def enabled():
+    return sink is not None
+
+
+@contextmanager
+def recording(new_sink):
+    '''Routes measurements to new_sink for the duration of the with block.'''
+    old = set_sink(new_sink)
+    try:
+        yield new_sink
+    finally:
+        set_sink(old)
+
+
+def timed(pricer, phase_name, calc, *args):
+    '''Calls calc(*args), reporting its run time as phase_name of pricer. Returns calc's result.
+
+    Callers check `instrument.sink is None` first and call calc directly in that
+    case, which keeps the disabled path to a single attribute check.'''
+    active = sink
+    if active is None:
+        return calc(*args)
+    start = _begin()
+    try:
+        return calc(*args)
+    finally:
+        _end(active, pricer, phase_name, start)
+
+
+def _begin():
+    _child_time.append(0.0)
+    return time.perf_counter()
+
+
+def _end(active, pricer, phase_name, start):
+    elapsed = time.perf_counter() - start
+    children = _child_time.pop()
+    _child_time[-1] += elapsed
+    active.record_time(pricer, phase_name, elapsed - children)
+
+
+class _Phase:
+    __slots__ = ('sink', 'pricer', 'name', 'start')
+
+    def __init__(self, active, pricer, name):
+        self.sink = active
+        self.pricer = pricer
+        self.name = name
+
+    def __enter__(self):
+        self.start = _begin()
+        return self
+
+    def __exit__(self, *exc):
+        _end(self.sink, self.pricer, self.name, self.start)
+        return False
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(pricer, name):
+    '''Context manager timing a block as one phase of pricer. A shared no-op when disabled.'''
+    active = sink
+    if active is None:
+        return _NO_PHASE
+    return _Phase(active, pricer, name)
+
+
+def count(pricer, name, n = 1):
+    active = sink
+    if active is not None:
+        active.record_count(pricer, name, n)
+
+
+def value(pricer, name, amount):
+    active = sink
+    if active is not None:
+        active.record_value(pricer, name, amount)
+
+
+class MemorySink:
+    '''Aggregates measurements in memory.
+
+    timings and values map (pricer, name) to [count, total, max]; counters map
+    (pricer, name) to a running total.'''
+    def __init__(self):
+        self.timings = {}
+        self.counters = {}
+        self.values = {}
+
+    def __repr__(self):
+        return '\nMemorySink with {} timed phases, {} counters and {} values.'.format(
+            len(self.timings), len(self.counters), len(self.values))
+
+    def aggregate(self, table, key, amount):
+        entry = table.get(key)
+        if entry is None:
+            table[key] = [1, amount, amount]
+        else:
+            entry[0] += 1
+            entry[1] += amount
+            if amount > entry[2]:
+                entry[2] = amount
+
+    def record_time(self, pricer, phase_name, seconds):
+        self.aggregate(self.timings, (pricer, phase_name), seconds)
+
+    def record_count(self, pricer, name, n):
+        key = (pricer, name)
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def record_value(self, pricer, name, amount):
+        self.aggregate(self.values, (pricer, name), amount)
+
+    def clear(self):
+        self.timings.clear()
+        self.counters.clear()
+        self.values.clear()
+
+    def summary(self):
+        '''Plain dict summary, suitable for json.dumps.'''
+        def rows(table):
+            return {'{}.{}'.format(*key): {'count': entry[0], 'total': entry[1],
+                                          'mean': entry[1] / entry[0], 'max': entry[2]}
+                    for key, entry in table.items()}
+        return {'timings': rows(self.timings),
+                'counters': {'{}.{}'.format(*key): n for key, n in self.counters.items()},
+                'values': rows(self.values)}
+
+    def report(self):
+        '''Prints the timings (slowest phase first), counters and values.'''
+        print('{:<36} {:>10} {:>12} {:>12}'.format('phase', 'calls', 'total s', 'mean us'))
+        for key, entry in sorted(self.timings.items(), key=lambda item: -item[1][1]):
+            print('{:<36} {:>10} {:>12.6f} {:>12.3f}'.format('{}.{}'.format(*key), entry[0],
+                                                              entry[1], 1e6 * entry[1] / entry[0]))
+        for key, n in sorted(self.counters.items()):
+            print('{:<36} {:>10}'.format('{}.{}'.format(*key), n))
+        for key, entry in sorted(self.values.items()):
+            print('{:<36} {:>10} {:>12.6g} {:>12.6g}'.format('{}.{}'.format(*key), entry[0],
+                                                              entry[1] / entry[0], entry[2]))
+
+
+class JsonLinesSink:
+    '''Writes every measurement as one JSON object per line.
+
+    Takes a path (opened for appending) or an already open text file.'''
+    def __init__(self, target):
+        if isinstance(target, str):
+            self.handle = open(target, 'a')
+            self.owns_handle = True
+        else:
+            self.handle = target
+            self.owns_handle = False
+
+    def write(self, kind, pricer, name, amount):
+        self.handle.write(json.dumps({'ts': time.time(), 'kind': kind, 'pricer': pricer,
+                                      'name': name, 'value': amount}) + '\n')
+
+    def record_time(self, pricer, phase_name, seconds):
+        self.write('time', pricer, phase_name, seconds)
+
+    def record_count(self, pricer, name, n):
+        self.write('count', pricer, name, n)
+
+    def record_value(self, pricer, name, amount):
+        self.write('value', pricer, name, amount)
+
+    def close(self):
+        if self.owns_handle:
+            self.handle.close()
+        else:
+            self.handle.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,111 @@
+from collections import OrderedDict
+import time
+
+from atop.blackscholes.bsmnode import BsmNode
+from atop.options.nperiodbopm import NPeriodBOPM
+from atop.util.tagit import generate_asset_tag, quantize
+
+_MISSING = object()  # sentinel, None can be a legitimate cached value
+
+
+class PricingCache:
+    '''Bounded LRU (and optional TTL) cache of priced assets, keyed on asset tags.
+
+    Sits in front of the pricers: bsm_node and nperiod_bopm return a cached
+    object when an identical contract (same canonical tag from
+    generate_asset_tag) was priced recently, and only construct a new one on a
+    miss. With ticks, inputs are snapped to their tick before both tagging and
+    pricing, so a cached result is exactly the price of its tag.
+
+    maxsize bounds the number of entries; the least recently used entry is
+    evicted first. ttl (seconds) expires entries regardless of use.
+    Statistics for sizing the cache: hits, misses, evictions, expirations.
+
+    Cached objects are shared between callers, so treat them as read-only.'''
+    def __init__(self, maxsize = 10_000, ttl = None, ticks = None, clock = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ticks = ticks or {}
+        self.clock = clock
+        self.entries = OrderedDict()  # tag -> (stored at, value)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __repr__(self):
+        return '\nPricing cache: {} / {} entries, hit rate {:.1%}.'.format(
+            len(self.entries), self.maxsize, self.hit_rate())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, tag):
+        return tag in self.entries
+
+    def get(self, tag, default = None):
+        entry = self.entries.get(tag)
+        if entry is None:
+            self.misses += 1
+            return default
+        if self.ttl is not None and self.clock() - entry[0] > self.ttl:
+            del self.entries[tag]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self.entries.move_to_end(tag)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, tag, value):
+        self.entries[tag] = (self.clock(), value)
+        self.entries.move_to_end(tag)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_price(self, tag, pricer):
+        '''Returns the cached value for tag, or calls pricer() and caches its result.'''
+        value = self.get(tag, _MISSING)
+        if value is _MISSING:
+            value = pricer()
+            self.put(tag, value)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {'size': len(self.entries), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'expirations': self.expirations,
+                'hit_rate': self.hit_rate()}
+
+    # pricers
+    def snap(self, underlying, strike, volatility, risk_free, time_in_years):
+        return (quantize(underlying, self.ticks.get('underly')),
+                quantize(strike, self.ticks.get('strike')),
+                quantize(volatility, self.ticks.get('vol')),
+                quantize(risk_free, self.ticks.get('rf')),
+                quantize(time_in_years, self.ticks.get('maturity')))
+
+    def bsm_node(self, op_type, underlying, strike, volatility, risk_free, time_in_years, dividend_yield = 0.0):
+        inputs = self.snap(underlying, strike, volatility, risk_free, time_in_years)
+        dividend_yield = quantize(dividend_yield, self.ticks.get('dividend'))
+        tag = generate_asset_tag(op_type, None, *inputs, model='BSM', dividend_yield=dividend_yield)
+        return self.get_or_price(tag, lambda: BsmNode(op_type, *inputs, dividend_yield=dividend_yield))
+
+    def nperiod_bopm(self, op_type, underlying, strike, volatility, risk_free, nperiods, time_in_years, **options):
+        '''options are passed through to NPeriodBOPM (factor_method, exercise, acceleration, ...).'''
+        underlying, strike, volatility, risk_free, time_in_years = self.snap(
+            underlying, strike, volatility, risk_free, time_in_years)
+        tag = generate_asset_tag(op_type, None, underlying, strike, volatility, risk_free, time_in_years,
+                                 model='NPeriodBOPM', nperiods=nperiods, **options)
+        return self.get_or_price(tag, lambda: NPeriodBOPM(op_type, underlying, strike, volatility, risk_free,
+                                                          nperiods, time_in_years, **options))
+
@@ -1,6 +1,40 @@
-def generate_asset_tag(asset_type, price, underly, strike, vol, rf, maturity):
-    tag = ''
-    
-    
+from numbers import Real
 
-    return tag
\ No newline at end of file
+
+def quantize(value, tick = None):
+    '''Snaps value to the nearest multiple of tick (no-op when tick is None).
+
+    Rounded to 12 decimals afterwards so the binary noise of tick multiples
+    (0.30000000000000004 and friends) never splits one tag into two.'''
+    if tick is None:
+        return float(value)
+    return round(round(value / tick) * tick, 12)
+
+
+def generate_asset_tag(asset_type, price, underly, strike, vol, rf, maturity, ticks = None, **extra):
+    '''Canonical text tag for an asset, usable as a cache key.
+
+    Equal inputs always give equal tags: numbers are normalised to floats (so 100
+    and 100.0 match), numeric extra keyword fields included, and extra fields
+    are sorted by name. price is the
+    quoted premium and may be None when the tag describes an unpriced contract.
+
+    ticks optionally maps input names ('price', 'underly', 'strike', 'vol', 'rf',
+    'maturity') to tick sizes. Inputs are snapped to their tick first, so nearby
+    requests (spot 100.001 and 100.002 at a 0.01 tick) share one tag. Numeric
+    extra fields take a tick under their own name.'''
+    ticks = ticks or {}
+    fields = [('underly', underly), ('strike', strike), ('vol', vol), ('rf', rf), ('maturity', maturity)]
+    if price is not None:
+        fields.insert(0, ('price', price))
+
+    tag = str(asset_type)
+    for name, value in fields:
+        tag += '|{}={!r}'.format(name, quantize(value, ticks.get(name)))
+    for name in sorted(extra):
+        value = extra[name]
+        if isinstance(value, Real) and not isinstance(value, bool):
+            value = quantize(value, ticks.get(name))
+        tag += '|{}={!r}'.format(name, value)
+
+    return tag
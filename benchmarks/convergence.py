@@ -0,0 +1,59 @@
+'''Convergence of NPeriodBOPM against the Black-Scholes-Merton closed form.
+
+Prints the absolute pricing error (and run time) for each factor_method and
+acceleration mode across a range of step counts. European contracts are used
+so BsmNode gives the exact answer.
+
+Run from the repo root:
+    python -m benchmarks.convergence'''
+
+import time
+
+from atop.blackscholes.bsmnode import BsmNode
+from atop.options.nperiodbopm import NPeriodBOPM
+
+FACTOR_METHODS = ['Jarrow', 'Cox', 'Leisen', 'Trinomial']
+ACCELERATIONS = [None, 'BBS', 'Richardson', 'BBSR']
+STEPS = [25, 50, 100, 200, 400, 800, 1600, 3200]
+
+# (op_type, underlying, strike, volatility, risk_free, time_in_years)
+CONTRACTS = [
+    ('Call', 100, 100, 0.20, 0.05, 1),
+    ('Put', 100, 110, 0.30, 0.05, 1),
+    ('Call', 100, 130, 0.25, 0.03, 0.5),
+]
+
+
+def convergence_table(contract, factor_methods = FACTOR_METHODS, accelerations = ACCELERATIONS, steps = STEPS):
+    '''Returns rows of (factor_method, acceleration, nperiods, abs error, seconds).'''
+    op_type, underlying, strike, volatility, risk_free, time_in_years = contract
+    exact = BsmNode(op_type, underlying, strike, volatility, risk_free, time_in_years).price
+    rows = []
+    for factor_method in factor_methods:
+        for acceleration in accelerations:
+            if factor_method == 'Leisen' and acceleration in ('BBS', 'BBSR'):
+                continue  # not supported, Leisen-Reimer needs no smoothing
+            if factor_method == 'Trinomial' and acceleration == 'Richardson':
+                continue  # not supported, only BBSR for trinomial lattices
+            for nperiods in steps:
+                start = time.perf_counter()
+                model = NPeriodBOPM(op_type, underlying, strike, volatility, risk_free,
+                                    nperiods, time_in_years,
+                                    factor_method = factor_method,
+                                    acceleration = acceleration)
+                elapsed = time.perf_counter() - start
+                rows.append((factor_method, acceleration, nperiods, abs(model.price - exact), elapsed))
+    return rows
+
+
+def print_table(contract, rows):
+    print('\n{} S={} K={} vol={} rf={} T={}'.format(*contract))
+    print('{:<10} {:<11} {:>7} {:>14} {:>10}'.format('factor', 'accel', 'steps', 'abs error', 'seconds'))
+    for factor_method, acceleration, nperiods, error, elapsed in rows:
+        print('{:<10} {:<11} {:>7} {:>14.3e} {:>10.4f}'.format(factor_method, str(acceleration),
+                                                             nperiods, error, elapsed))
+
+
+if __name__ == '__main__':
+    for contract in CONTRACTS:
+        print_table(contract, convergence_table(contract))
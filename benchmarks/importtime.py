@@ -0,0 +1,78 @@
+'''Import time of the atop entry points.
+
+Each module is imported in a fresh interpreter (best of --repeat runs) and
+checked against its time budget. The pricers must also never pull in scipy:
+the normal cdf/pdf come from atop.util.normal, and scipy is only loaded by the
+engines that need its solvers (CrankNicolson). A module that goes over budget
+or imports scipy is reported and the run exits non-zero.
+
+Run from the repo root:
+    python -m benchmarks.importtime'''
+
+import argparse
+import os
+import subprocess
+import sys
+
+# module -> import time budget in seconds. The NumPy based pricers pay for NumPy itself.
+BUDGETS = {
+    'atop': 0.05,
+    'atop.blackscholes.bsmnode': 0.1,
+    'atop.blackscholes.bsm_old': 0.1,
+    'atop.blackscholes.bsmchain': 0.5,
+    'atop.blackscholes.impliedvol': 0.5,
+    'atop.options.nperiodbopm': 0.5,
+    'atop.opsport': 0.5,
+    'atop.stressgrid': 0.5,
+    'atop.quotestream': 0.5,
+}
+
+PROBE = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, int(any(name == 'scipy' or name.startswith('scipy.') for name in sys.modules)))
+'''
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(module, repeat = 5):
+    '''(best seconds, scipy imported) for importing module in a fresh interpreter.'''
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    best, scipy_loaded = float('inf'), False
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module=module)], env=env,
+                                capture_output=True, text=True, check=True).stdout.split()
+        best = min(best, float(output[0]))
+        scipy_loaded = scipy_loaded or output[1] == '1'
+    return best, scipy_loaded
+
+
+def run(repeat = 5):
+    '''Returns {module: (seconds, budget, scipy imported)}.'''
+    return {module: import_time(module, repeat) + (budget,) for module, budget in BUDGETS.items()}
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module, the best is kept')
+    args = parser.parse_args(argv)
+
+    failures = []
+    print('{:<32} {:>10} {:>10} {:>7}'.format('module', 'ms', 'budget ms', 'scipy'))
+    for module, (seconds, scipy_loaded, budget) in run(args.repeat).items():
+        print('{:<32} {:>10.1f} {:>10.0f} {:>7}'.format(module, 1e3 * seconds, 1e3 * budget,
+                                                        'yes' if scipy_loaded else 'no'))
+        if seconds > budget:
+            failures.append('{} took {:.0f} ms, budget {:.0f} ms'.format(module, 1e3 * seconds, 1e3 * budget))
+        if scipy_loaded:
+            failures.append('{} imported scipy'.format(module))
+    for message in failures:
+        print('REGRESSION ' + message)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,99 @@
+'''Parallel scaling of ParallelPricer across worker counts.
+
+Prices the same batch with 1, 2, 4, ... workers (up to the CPU count, or
+--workers) and prints the wall time, the speedup over one worker and the
+parallel efficiency (speedup / workers). The pool is started before the
+timed run, so process start-up isn't counted.
+
+Run from the repo root:
+    python -m benchmarks.scaling
+    python -m benchmarks.scaling --contracts 2000 --nperiods 2000'''
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from atop.parallel import ParallelPricer
+from benchmarks.suite import random_chain
+
+
+def worker_counts(most):
+    counts = [1]
+    while counts[-1] * 2 <= most:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != most:
+        counts.append(most)
+    return counts
+
+
+def time_workload(workers, workload, repeat):
+    with ParallelPricer(workers) as pool:
+        workload(pool)  # warm up: starts the pool and attaches the workers
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = workload(pool)
+            best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def lattice_workload(contracts, nperiods):
+    op_type, underlying, strike, volatility, risk_free, time_in_years = random_chain(contracts)
+    def workload(pool):
+        return pool.nperiod_bopm(op_type, underlying, strike, volatility, risk_free, nperiods, time_in_years,
+                                 exercise='American')
+    return workload
+
+
+def bsm_workload(contracts):
+    chain = random_chain(contracts)
+    def workload(pool):
+        return pool.bsm_chain(*chain)['price']
+    return workload
+
+
+def scaling_table(workload, counts, repeat):
+    '''Rows of (workers, seconds, speedup, efficiency); every run must match the one worker result.'''
+    rows = []
+    base_seconds, base_result = None, None
+    for workers in counts:
+        seconds, result = time_workload(workers, workload, repeat)
+        if base_result is None:
+            base_seconds, base_result = seconds, result
+        elif not np.array_equal(result, base_result):
+            raise AssertionError('{} workers gave different results from 1 worker.'.format(workers))
+        speedup = base_seconds / seconds
+        rows.append((workers, seconds, speedup, speedup / workers))
+    return rows
+
+
+def print_table(title, rows):
+    print('\n' + title)
+    print('{:>8} {:>10} {:>9} {:>11}'.format('workers', 'seconds', 'speedup', 'efficiency'))
+    for workers, seconds, speedup, efficiency in rows:
+        print('{:>8} {:>10.3f} {:>9.2f} {:>11.0%}'.format(workers, seconds, speedup, efficiency))
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='most workers to try')
+    parser.add_argument('--contracts', type=int, default=400, help='American lattices in the lattice batch')
+    parser.add_argument('--nperiods', type=int, default=1000, help='steps per lattice')
+    parser.add_argument('--book', type=int, default=4_000_000, help='contracts in the BSM book revaluation')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per worker count, the best is kept')
+    args = parser.parse_args(argv)
+
+    counts = worker_counts(args.workers)
+    if counts == [1]:
+        print('Only one CPU available, scaling can not be measured beyond one worker.')
+    print_table('{} American NPeriodBOPM lattices, {} steps'.format(args.contracts, args.nperiods),
+                scaling_table(lattice_workload(args.contracts, args.nperiods), counts, args.repeat))
+    print_table('BSM revaluation of {} contracts'.format(args.book),
+                scaling_table(bsm_workload(args.book), counts, args.repeat))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,69 @@
+'''Throughput and latency of the pricing service, with and without micro-batching.
+
+Starts a PricingServer on a free local port and drives it with --clients
+concurrent keep-alive connections, each sending single-contract POST /price
+requests back to back. Runs once per max_batch setting (1 is no batching)
+and prints requests per second, mean batch size and p50 / p99 latency as
+reported by the server.
+
+Run from the repo root:
+    python -m benchmarks.service
+    python -m benchmarks.service --clients 200 --requests 50000'''
+
+import argparse
+import asyncio
+import json
+import time
+
+from atop.service import PricingServer
+
+CONTRACT = {'op_type': 'Put', 'underlying': 100.0, 'strike': 110.0,
+            'volatility': 0.3, 'risk_free': 0.05, 'time_in_years': 1.0}
+
+
+async def client(port, requests, contract = CONTRACT):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(contract).encode()
+    request = ('POST /price HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+               'Content-Length: {}\r\n\r\n'.format(len(body))).encode() + body
+    for _ in range(requests):
+        writer.write(request)
+        head = await reader.readuntil(b'\r\n\r\n')
+        length = int(head.split(b'Content-Length: ')[1].split(b'\r\n')[0])
+        await reader.readexactly(length)
+    writer.close()
+
+
+async def load_run(max_batch, max_wait, clients, requests):
+    server = await PricingServer(port=0, max_batch=max_batch, max_wait=max_wait).start()
+    try:
+        per_client = max(1, requests // clients)
+        start = time.perf_counter()
+        await asyncio.gather(*(client(server.port, per_client) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+        summary = server.stats.summary()
+        summary['requests_per_second'] = summary['requests'] / elapsed
+        return summary
+    finally:
+        await server.stop()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=100, help='concurrent keep-alive connections')
+    parser.add_argument('--requests', type=int, default=20_000, help='requests in total per run')
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 16, 256], help='max_batch settings to try')
+    args = parser.parse_args(argv)
+
+    print('{:>10} {:>12} {:>11} {:>9} {:>9}'.format('max_batch', 'requests/s', 'mean batch', 'p50 ms', 'p99 ms'))
+    for max_batch in args.batches:
+        summary = asyncio.run(load_run(max_batch, args.max_wait_ms / 1e3, args.clients, args.requests))
+        print('{:>10} {:>12.0f} {:>11.1f} {:>9.2f} {:>9.2f}'.format(
+            max_batch, summary['requests_per_second'], summary['mean_batch'],
+            summary['p50_ms'], summary['p99_ms']))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,238 @@
+'''Benchmark and regression harness for every atop pricing engine.
+
+Times each engine across representative workload sizes and records
+    seconds      -- best wall time out of --repeat runs
+    throughput   -- contracts (or grid points) priced per second
+    peak_mb      -- peak Python memory of one run (tracemalloc, separate run)
+    error        -- max abs pricing error against the closed form, where one exists
+
+Results can be saved as a baseline and later runs compared against it; a
+benchmark that got slower (or less accurate) beyond the tolerance is reported
+as a regression and the run exits non-zero.
+
+Run from the repo root:
+    python -m benchmarks.suite                      # run and compare with the baseline
+    python -m benchmarks.suite --save-baseline      # run and store a new baseline
+    python -m benchmarks.suite --only NPeriodBOPM   # just the matching benchmarks'''
+
+import argparse
+import functools
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+from atop.blackscholes.bsm_old import bsm_find_call_price, bsm_find_put_price
+from atop.blackscholes.bsmchain import BsmChain
+from atop.blackscholes.bsmnode import BsmNode
+from atop.diagram import PayoffAsset, PayoffDiagram
+from atop.options.calloption import CallOption
+from atop.options.nperiodbopm import NPeriodBOPM
+from atop.options.putoption import PutOption
+from atop.simpleops.simplecall import SimpleCall
+from atop.simpleops.simpleput import SimplePut
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+@functools.lru_cache(maxsize=None)
+def random_chain(size, seed = 0):
+    '''Reproducible option chain around an underlying of 100 (cached, so setup stays out of the timings).'''
+    rng = np.random.default_rng(seed)
+    op_type = np.where(rng.random(size) < 0.5, 'Call', 'Put')
+    strike = rng.uniform(70, 130, size)
+    volatility = rng.uniform(0.1, 0.5, size)
+    risk_free = rng.uniform(0.0, 0.08, size)
+    time_in_years = rng.uniform(0.05, 2.0, size)
+    return op_type, np.full(size, 100.0), strike, volatility, risk_free, time_in_years
+
+
+@functools.lru_cache(maxsize=None)
+def contract_list(size):
+    # plain Python scalars, the way scalar pricers are called in practice
+    return [tuple(value.item() for value in contract) for contract in zip(*random_chain(size))]
+
+
+def closed_form(op_type, underlying, strike, volatility, risk_free, time_in_years):
+    if op_type == 'Call':
+        return bsm_find_call_price(underlying, strike, volatility, risk_free, time_in_years)
+    return bsm_find_put_price(underlying, strike, volatility, risk_free, time_in_years)
+
+
+def chain_error(size, prices, sample = 200):
+    '''Max abs difference from the closed form over the first contracts of the chain.'''
+    return max(abs(price - closed_form(*contract))
+               for price, contract in zip(prices[:sample], contract_list(size)[:sample]))
+
+
+# every benchmark takes a workload size and returns (operations, result);
+# the optional check turns (size, result) into a max abs error, outside the timings.
+def bench_bsm_old(size):
+    return size, [closed_form(*contract) for contract in contract_list(size)]
+
+
+def bench_bsmnode(size):
+    return size, [BsmNode(*contract).price for contract in contract_list(size)]
+
+
+def bench_bsmnode_greeks(size):
+    nodes = [BsmNode(*contract) for contract in contract_list(size)]
+    return size, [(node.price, node.delta, node.gamma, node.theta) for node in nodes]
+
+
+def bench_bsmchain(size):
+    return size, BsmChain(*random_chain(size)).price
+
+
+NPERIOD_CONTRACT = ('Put', 100.0, 110.0, 0.3, 0.05, 1.0)
+
+
+def nperiod_bench(factor_method):
+    def bench(nperiods):
+        op_type, underlying, strike, volatility, risk_free, time_in_years = NPERIOD_CONTRACT
+        model = NPeriodBOPM(op_type, underlying, strike, volatility, risk_free,
+                            nperiods, time_in_years, factor_method = factor_method)
+        return 1, model.price
+    return bench
+
+
+def nperiod_check(nperiods, price):
+    return abs(price - closed_form(*NPERIOD_CONTRACT))
+
+
+def bench_binomialoption(size):
+    for i in range(size):
+        CallOption(100, 110, 121, 90.25, 0.05)
+        PutOption(100, 110, 121, 90.25, 0.05)
+    return 2 * size, None
+
+
+def bench_simpleoption(size):
+    for i in range(size):
+        SimpleCall(100, 110, 121, 90.25, 0.05)
+        SimplePut(100, 110, 121, 90.25, 0.05)
+    return 2 * size, None
+
+
+def bench_payoff_diagram(size):
+    legs = [PayoffAsset('Call', 'Long', 40, 12), PayoffAsset('Call', 'Short', 50, 6, 2),
+            PayoffAsset('Call', 'Long', 60, 2.5), PayoffAsset('Put', 'Long', 45, 1.5)]
+    return size, PayoffDiagram(legs, np.linspace(0, 200, size))
+
+
+# name -> (benchmark, workload sizes, accuracy check or None)
+BENCHMARKS = {
+    'bsm_old.bsm_find_call_price': (bench_bsm_old, [1_000, 10_000], None),
+    'BsmNode.price': (bench_bsmnode, [1_000, 10_000], chain_error),
+    'BsmNode.greeks': (bench_bsmnode_greeks, [1_000, 10_000], None),
+    'BsmChain': (bench_bsmchain, [10_000, 100_000, 1_000_000], chain_error),
+    'NPeriodBOPM.Jarrow': (nperiod_bench('Jarrow'), [100, 500, 1_000, 5_000], nperiod_check),
+    'NPeriodBOPM.Cox': (nperiod_bench('Cox'), [100, 500, 1_000, 5_000], nperiod_check),
+    'BinomialOption': (bench_binomialoption, [10_000, 100_000], None),
+    'SimpleOption': (bench_simpleoption, [10_000, 100_000], None),
+    'PayoffDiagram': (bench_payoff_diagram, [1_000, 100_000, 1_000_000], None),
+}
+
+
+def measure(bench, size, repeat, check = None, min_seconds = 0.2):
+    bench(size)  # warm up caches and lazy imports
+    # like timeit: batch fast benchmarks so each timed run lasts at least min_seconds.
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            operations, result = bench(size)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds or number >= 1_000_000:
+            break
+        number *= max(2, int(min_seconds / max(elapsed, 1e-9)))
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            bench(size)
+        best = min(best, (time.perf_counter() - start) / number)
+
+    # memory is traced in a separate run, tracing slows the timed code down.
+    tracemalloc.start()
+    bench(size)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    error = None if check is None else float(check(size, result))
+    return {'seconds': best, 'throughput': operations / best, 'peak_mb': peak / 1e6, 'error': error}
+
+
+def run(only = None, repeat = 3):
+    results = {}
+    for name, (bench, sizes, check) in BENCHMARKS.items():
+        if only and only not in name:
+            continue
+        for size in sizes:
+            results['{}[{}]'.format(name, size)] = measure(bench, size, repeat, check)
+    return results
+
+
+def compare(results, baseline, tolerance = 0.4):
+    '''Returns a list of regression messages: throughput down or error up by more than tolerance.'''
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        if current['throughput'] < previous['throughput'] * (1 - tolerance):
+            regressions.append('{}: throughput {:.4g}/s vs baseline {:.4g}/s'.format(
+                key, current['throughput'], previous['throughput']))
+        if (current['error'] is not None and previous['error'] is not None
+                and current['error'] > previous['error'] * (1 + tolerance) + 1e-12):
+            regressions.append('{}: error {:.3e} vs baseline {:.3e}'.format(key, current['error'], previous['error']))
+    return regressions
+
+
+def print_results(results, baseline):
+    print('{:<40} {:>10} {:>14} {:>9} {:>11} {:>9}'.format(
+        'benchmark', 'seconds', 'ops/sec', 'peak MB', 'error', 'vs base'))
+    for key, row in results.items():
+        previous = baseline.get(key)
+        change = '' if previous is None else '{:+.0%}'.format(row['throughput'] / previous['throughput'] - 1)
+        error = '' if row['error'] is None else '{:.2e}'.format(row['error'])
+        print('{:<40} {:>10.4f} {:>14.4g} {:>9.2f} {:>11} {:>9}'.format(
+            key, row['seconds'], row['throughput'], row['peak_mb'], error, change))
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', help='run only benchmarks whose name contains this text')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per benchmark, the best is kept')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.4, help='allowed relative slowdown before flagging')
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+
+    results = run(args.only, args.repeat)
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as handle:
+            json.dump(dict(baseline, **results), handle, indent=2, sort_keys=True)
+        print('\nBaseline saved to {}'.format(args.baseline))
+        return 0
+
+    if not baseline:
+        print('\nNo baseline found, run with --save-baseline to store one.')
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for message in regressions:
+        print('REGRESSION ' + message)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())